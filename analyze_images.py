@@ -1,96 +1,77 @@
 import os
+import sys
 import csv
-import requests
-from PIL import Image
-from io import BytesIO
-import imagehash
-import cv2
-import numpy as np
-from skimage.metrics import structural_similarity as ssim
-
-# Setup folders
-os.makedirs("images/product", exist_ok=True)
-os.makedirs("images/avail", exist_ok=True)
-
-def download_image(url, save_path):
-    if os.path.exists(save_path):
-        return save_path
-    try:
-        r = requests.get(url, timeout=10)
-        if r.status_code == 200:
-            with open(save_path, "wb") as f:
-                f.write(r.content)
-            return save_path
-    except:
-        pass
-    return None
-
-def compute_similarity(img1_path, img2_path):
-    try:
-        # dHash
-        hash1 = imagehash.dhash(Image.open(img1_path).convert("RGB"))
-        hash2 = imagehash.dhash(Image.open(img2_path).convert("RGB"))
-        dhash_diff = hash1 - hash2
-
-        # SSIM
-        img1 = cv2.imread(img1_path)
-        img2 = cv2.imread(img2_path)
-        img1 = cv2.resize(img1, (200, 200))
-        img2 = cv2.resize(img2, (200, 200))
-        gray1 = cv2.cvtColor(img1, cv2.COLOR_BGR2GRAY)
-        gray2 = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY)
-        ssim_score = ssim(gray1, gray2)
-        return dhash_diff, ssim_score
-    except Exception as e:
-        return None, None
-
-# Read input CSV
-html_rows = []
-with open("results/products_final.csv", newline='', encoding="utf-8") as f:
-    reader = csv.DictReader(f)
-    for row in reader:
-        pid = row["product_id"]
-        cover_url = row["cover_url"]
-        avail_urls = row["avail_urls"].split(";")
-
-        product_img = f"images/product/{pid}.jpg"
-        download_image(cover_url, product_img)
-
-        comparison_rows = []
-        best_score = -1
-        best_html = ""
-
-        for i, a_url in enumerate(avail_urls):
-            aid = f"{pid}_{i}"
-            a_img = f"images/avail/{aid}.jpg"
-            download_image(a_url, a_img)
-
-            dhash_diff, ssim_score = compute_similarity(product_img, a_img)
-            if dhash_diff is None or ssim_score is None:
-                continue
-
-            html_block = f"""
+import multiprocessing
+import logging
+import instrument
+import image_analysis
+
+# Config
+CSV_FILE = "results/products_final.csv"
+PRODUCT_FOLDER = "images/product"
+AVAIL_FOLDER = "images/avail"
+OUTPUT_HTML = "results/task2_similarity_report.html"
+WORKERS = int(os.environ.get("ANALYZE_WORKERS", "4"))
+
+
+def _compare_row(row):
+    return row["product_id"], image_analysis.compare_product(
+        row["product_id"], row["cover_url"], row["avail_urls"].split(";"), PRODUCT_FOLDER, AVAIL_FOLDER
+    )
+
+
+def _compare_task(row):
+    # Pool workers exit without running atexit, so their metrics travel back with each result
+    return _compare_row(row), instrument.drain()
+
+
+def make_pool(workers=WORKERS):
+    # Fork on Linux: modules preloaded here are shared with every worker. Forking
+    # after cv2/numpy are loaded is unsafe on macOS, so other platforms keep their default.
+    ctx = multiprocessing.get_context("fork" if sys.platform.startswith("linux") else None)
+    if ctx.get_start_method() == "fork":
+        image_analysis.preload()
+    return ctx.Pool(workers, initializer=image_analysis.init_worker, initargs=("analyze_images",))
+
+
+def compare_products(csv_file=CSV_FILE, workers=WORKERS):
+    # Read input CSV
+    with open(csv_file, newline='', encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+
+    if workers > 1:
+        results = []
+        with make_pool(workers) as pool:
+            for result, metrics in pool.map(_compare_task, rows):
+                instrument.merge(metrics)
+                results.append(result)
+    else:
+        results = [_compare_row(row) for row in rows]
+
+    html_rows = []
+    for pid, (product_img, comparisons) in results:
+        cells = "".join(f"""
             <td>
                 <img src="../{a_img}" height="120"><br>
                 <b>SSIM:</b> {ssim_score:.3f}<br>
                 <b>dHash Δ:</b> {dhash_diff}
             </td>
-            """
-            comparison_rows.append((ssim_score, html_block))
-
-        # Sort by best match
-        comparison_rows.sort(key=lambda x: -x[0])  # SSIM descending
+            """ for ssim_score, dhash_diff, a_img in comparisons)
 
         row_html = f"""
         <tr>
             <td><b>{pid}</b><br><img src="../{product_img}" height="150"></td>
-            {''.join(html for _, html in comparison_rows)}
+            {cells}
         </tr>
         """
         html_rows.append(row_html)
+    return html_rows
+
 
-# Build HTML
-html = f"""
+def render_report(html_rows):
+    # Build HTML
+    with instrument.timer("render", products=len(html_rows)):
+        html = f"""
 <html>
 <head>
     <title>Task 2 - Image Similarity Viewer</title>
@@ -113,9 +94,26 @@ html = f"""
 </body>
 </html>
 """
+    return html
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    instrument.setup("analyze_images")
+
+    # Setup folders
+    os.makedirs(PRODUCT_FOLDER, exist_ok=True)
+    os.makedirs(AVAIL_FOLDER, exist_ok=True)
+
+    html_rows = compare_products()
+    html = render_report(html_rows)
+
+    # Save HTML file
+    with open(OUTPUT_HTML, "w", encoding="utf-8") as f:
+        f.write(html)
+
+    print(f"✅ HTML report saved to: {OUTPUT_HTML}")
 
-# Save HTML file
-with open("results/task2_similarity_report.html", "w", encoding="utf-8") as f:
-    f.write(html)
 
-print("✅ HTML report saved to: results/task2_similarity_report.html")
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,15 @@
 import csv
+import sys
 import re
-import time
-import random
 import logging
 from playwright.sync_api import sync_playwright, Page
+import instrument
+import session_pool
+import crawl_fixtures
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+PRODUCT_URL = f"{session_pool.BASE_URL}/product/zimmermann-crush-belted-embellished-floral-print-linen-mini-dress-multi-105444977/"
 
+@instrument.timed("extract_product")
 def get_avail_ids_and_urls(page: Page):
     avail_data = []
     avail_blocks = page.query_selector_all('div.avail[id^="a"]')
@@ -23,18 +26,34 @@ def get_avail_ids_and_urls(page: Page):
 
     return avail_data
 
-def scrape_modesens():
-    url = "https://modesens.cn/product/zimmermann-crush-belted-embellished-floral-print-linen-mini-dress-multi-105444977/"
+def load_product(page: Page, url):
+    for attempt in range(session_pool.BLOCK_RETRIES):
+        if attempt:
+            instrument.incr("safe_get_retries")
+        with instrument.timer("page_load", url=url, attempt=attempt):
+            page.goto(url, timeout=60000)
+        if not session_pool.looks_blocked(page.title(), page.content()):
+            return True
+        session_pool.wait_out_block(url, attempt)
+        if session_pool.WAIT_ON_BLOCK and not session_pool.looks_blocked(page.title(), page.content()):
+            return True  # solved by hand in the open page
+    instrument.incr("page_load_failures")
+    return False
+
+def scrape_modesens(url=PRODUCT_URL):
     product_id = re.search(r'-(\d+)/?$', url).group(1)
 
     with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False)
-        context = browser.new_context(user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64)")
+        context = session_pool.playwright_context(p, headless=False, user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64)")
         page = context.new_page()
 
         logging.info("🔗 正在打开ModeSens商品页面")
-        page.goto(url, timeout=60000)
-        time.sleep(random.uniform(3, 5))
+        if not load_product(page, url):
+            logging.error(f"❌ Still blocked after {session_pool.BLOCK_RETRIES} attempts: {url}")
+            context.close()
+            return
+        session_pool.pause(3, 5)
+        crawl_fixtures.record_page(page)
 
         try:
             cover_url = page.query_selector("meta[property='og:image']").get_attribute("content")
@@ -54,8 +73,15 @@ def scrape_modesens():
             writer = csv.writer(f)
             writer.writerow(["product_id", "cover_url", "avail_ids", "avail_urls"])
             writer.writerow([product_id, cover_url, '|'.join(avail_ids), '|'.join(avail_urls)])
+        instrument.incr("products_saved")
+
+        session_pool.save_playwright_cookies(context)
+        context.close()
 
-        browser.close()
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    instrument.setup("avail")
+    scrape_modesens(sys.argv[1] if len(sys.argv) > 1 else PRODUCT_URL)
 
 if __name__ == "__main__":
-    scrape_modesens()
+    main()
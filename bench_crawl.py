@@ -0,0 +1,113 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import crawl_fixtures
+
+# Config
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+MODES = ["task1new", "crawler", "getdata", "avail"]
+SAMPLE_PRODUCT_ID = "105444977"
+
+
+def mode_command(mode, origin, product_id):
+    script = os.path.join(REPO_DIR, f"{mode}.py")
+    if mode == "getdata":
+        return [sys.executable, script, product_id]
+    if mode == "avail":
+        return [sys.executable, script, f"{origin}/product/item-{product_id}/"]
+    return [sys.executable, script]
+
+
+def read_metrics(metrics_path):
+    """Summary stats plus retry time (backoff, CAPTCHA waits and repeated page loads)."""
+    summary, retry_secs = {"stages": {}, "counters": {}}, 0.0
+    if not os.path.exists(metrics_path):
+        return summary, retry_secs
+    with open(metrics_path, encoding="utf-8") as f:
+        for line in f:
+            event = json.loads(line)
+            if event["event"] == "summary":
+                summary = event
+            elif event["event"] == "timing":
+                if event["stage"] in ("retry_backoff", "captcha_wait") or event.get("attempt", 0) > 0:
+                    retry_secs += event["secs"]
+    return summary, retry_secs
+
+
+def run_mode(mode, server, workdir, env, product_id):
+    cwd = os.path.join(workdir, mode)
+    os.makedirs(cwd, exist_ok=True)
+    captchas_before = server.captchas
+
+    start = time.perf_counter()
+    result = subprocess.run(mode_command(mode, server.origin, product_id), cwd=cwd, env=env,
+                            stdin=subprocess.DEVNULL, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+
+    summary, retry_secs = read_metrics(os.path.join(cwd, "results", "metrics", f"{mode}.jsonl"))
+    stages, counters = summary["stages"], summary["counters"]
+    pages = stages.get("page_load", {}).get("count", 0)
+    products = counters.get("products_saved", 0)
+    return {
+        "mode": mode,
+        "ok": result.returncode == 0,
+        "wall": wall,
+        "pages": pages,
+        "pages_per_sec": pages / wall if wall else 0.0,
+        "products": products,
+        "products_per_sec": products / wall if wall else 0.0,
+        "retries": counters.get("safe_get_retries", 0),
+        "blocked": counters.get("captcha_blocks", 0),
+        "captchas_served": server.captchas - captchas_before,
+        "retry_overhead": retry_secs / wall if wall else 0.0,
+        "stderr": result.stderr.strip().splitlines()[-1:] if result.returncode else [],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawler throughput against a local replay server.")
+    parser.add_argument("--archive", help="recorded archive to replay (default: synthesize one from --csv)")
+    parser.add_argument("--csv", default=os.path.join(REPO_DIR, "results", "products_final.csv"))
+    parser.add_argument("--modes", nargs="*", default=MODES, choices=MODES)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--captcha-rate", type=float, default=0.05)
+    parser.add_argument("--delay-scale", type=float, default=0.0, help="CRAWL_DELAY_SCALE for the crawlers")
+    parser.add_argument("--browsers", type=int, default=1, help="CRAWL_BROWSERS for task1new")
+    parser.add_argument("--product-id", default=SAMPLE_PRODUCT_ID)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_crawl_") as workdir:
+        archive_dir = args.archive or crawl_fixtures.synthesize(args.csv, os.path.join(workdir, "archive")).path
+        server = crawl_fixtures.serve(archive_dir, latency=args.latency, jitter=args.jitter,
+                                      captcha_rate=args.captcha_rate)
+        env = dict(os.environ,
+                   MODESENS_BASE_URL=server.origin,
+                   CRAWL_DELAY_SCALE=str(args.delay_scale),
+                   CRAWL_BROWSERS=str(args.browsers),
+                   CRAWL_WAIT_ON_BLOCK="0",
+                   CRAWL_HEADLESS="1",
+                   CRAWL_RECORD_DIR="",
+                   SESSION_DIR=os.path.join(workdir, "session"),
+                   METRICS_DIR="results/metrics")
+
+        print(f"🔁 Replaying {archive_dir} at {server.origin} "
+              f"(latency {args.latency}s + {args.jitter}s jitter, captcha rate {args.captcha_rate})")
+        print(f"{'mode':<10} {'wall':>8} {'pages':>6} {'pages/s':>8} {'prods':>6} {'prods/s':>8} "
+              f"{'retries':>8} {'blocked':>8} {'retry %':>8}")
+        for mode in args.modes:
+            r = run_mode(mode, server, workdir, env, args.product_id)
+            print(f"{r['mode']:<10} {r['wall']:>7.1f}s {r['pages']:>6} {r['pages_per_sec']:>8.2f} "
+                  f"{r['products']:>6g} {r['products_per_sec']:>8.2f} {r['retries']:>8g} {r['blocked']:>8g} "
+                  f"{r['retry_overhead'] * 100:>7.1f}%")
+            if not r["ok"]:
+                print(f"   ⚠️ {mode} exited with an error: {' '.join(r['stderr'])}")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import sys
+import time
+import statistics
+import subprocess
+from image_analysis import HEAVY_MODULES
+
+# Config
+REPEATS = 5
+MODULES = ["analyze_images", "task2_similarity_grouped", "task2_similarity", "image_analysis", "thumb_store"]
+
+
+def time_import(code, repeats=REPEATS):
+    """Median wall time of a fresh interpreter running `code`, or None if it fails."""
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True)
+        if result.returncode != 0:
+            return None
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    baseline = time_import("pass")
+    eager = time_import("import " + ", ".join(HEAVY_MODULES))
+
+    print(f"{'case':<40} {'median':>9} {'vs bare':>9}")
+    rows = [("bare interpreter", baseline), ("eager heavy imports (old behaviour)", eager)]
+    rows += [(f"import {name}", time_import(f"import {name}")) for name in MODULES]
+    for label, secs in rows:
+        if secs is None:
+            print(f"{label:<40} {'n/a':>9} {'':>9}")
+        else:
+            print(f"{label:<40} {secs * 1000:>7.1f}ms {(secs - baseline) * 1000:>+7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+import os
+import csv
+import json
+import time
+import atexit
+import random
+import hashlib
+import argparse
+import threading
+from urllib.parse import urlsplit
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Config
+RECORD_DIR = os.environ.get("CRAWL_RECORD_DIR", "")  # set to capture every crawled page into an archive
+INDEX_FILE = "index.json"
+SAVE_EVERY = 50  # pages recorded between index.json writes; the rest is saved at exit
+LIVE_ORIGIN = "https://modesens.cn"
+
+CAPTCHA_HTML = "<html><head><title>安全验证</title></head><body><div id=\"captcha\">captcha</div></body></html>"
+EMPTY_LISTING_HTML = "<html><head><title>ModeSens</title></head><body><div class=\"collections\"></div></body></html>"
+NOT_FOUND_HTML = "<html><head><title>404 Not Found</title></head><body></body></html>"
+
+_record_lock = threading.Lock()
+_archives = {}
+
+
+def url_key(url):
+    # Archive keys are path + query, so recordings replay under any host
+    parts = urlsplit(url)
+    return parts.path + (f"?{parts.query}" if parts.query else "")
+
+
+# === Archive ===
+class Archive:
+    """A directory of HTML pages plus an index.json mapping url keys to files."""
+
+    def __init__(self, path):
+        self.path = path
+        self.index = {}
+        self.unsaved = 0
+        index_path = os.path.join(path, INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path, encoding="utf-8") as f:
+                self.index = json.load(f)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def get(self, key):
+        name = self.index.get(key)
+        if name is None:
+            return None
+        with open(os.path.join(self.path, name), encoding="utf-8") as f:
+            return f.read()
+
+    def put(self, key, html):
+        os.makedirs(self.path, exist_ok=True)
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16] + ".html"
+        with open(os.path.join(self.path, name), "w", encoding="utf-8") as f:
+            f.write(html)
+        self.index[key] = name
+        self.unsaved += 1
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        index_path = os.path.join(self.path, INDEX_FILE)
+        with open(index_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.index, f, ensure_ascii=False, indent=1)
+        os.replace(index_path + ".tmp", index_path)
+        self.unsaved = 0
+
+
+# === Recording ===
+def record(url, html, archive_dir=None):
+    archive_dir = archive_dir or RECORD_DIR
+    if not archive_dir:
+        return
+    with _record_lock:
+        archive = _archives.get(archive_dir)
+        if archive is None:
+            if not _archives:
+                atexit.register(flush)
+            archive = _archives[archive_dir] = Archive(archive_dir)
+        archive.put(url_key(url), html)
+        if archive.unsaved >= SAVE_EVERY:
+            archive.save()
+
+
+def flush():
+    """Write the index of every archive with pages recorded since its last save."""
+    with _record_lock:
+        for archive in _archives.values():
+            if archive.unsaved:
+                archive.save()
+
+
+def record_driver(driver):
+    """Capture the current Selenium page when CRAWL_RECORD_DIR is set."""
+    if RECORD_DIR:
+        record(driver.current_url, driver.page_source)
+
+
+def record_page(page):
+    """Capture the current Playwright page when CRAWL_RECORD_DIR is set."""
+    if RECORD_DIR:
+        record(page.url, page.content())
+
+
+def synthesize(csv_file, archive_dir, per_page=40):
+    """Build listing and product pages from a products CSV, for replay without any live capture."""
+    with open(csv_file, newline='', encoding="utf-8") as f:
+        rows = [row for row in csv.DictReader(f) if row["product_id"]]
+
+    archive = Archive(archive_dir)
+    for start in range(0, len(rows), per_page):
+        cards = "".join(
+            f'<div class="prdcard-wrapper"><a href="/product/item-{row["product_id"]}/">'
+            f'<img src="{row["cover_url"]}"></a></div>\n'
+            for row in rows[start:start + per_page]
+        )
+        html = f"<html><head><title>ModeSens</title></head><body>\n{cards}</body></html>"
+        page = start // per_page + 1
+        archive.put(f"/collections/?page={page}", html)
+        if page == 1:
+            archive.put("/collections/", html)
+
+    for row in rows:
+        pid = row["product_id"]
+        avails = "".join(
+            f'<div class="avail" id="{aid}"><a href="/product/avail/{aid[1:]}/getlink/">浏览商店</a></div>\n'
+            for aid in row["avail_ids"].split(";") if aid
+        )
+        html = (f'<html><head><title>ModeSens {pid}</title>'
+                f'<meta property="og:image" content="{row["cover_url"]}"></head><body>\n'
+                f'<img src="{row["cover_url"]}">\n{avails}</body></html>')
+        archive.put(f"/product/item-{pid}/", html)
+        archive.put(f"/product/{pid}/", html)
+
+    archive.save()
+    return archive
+
+
+# === Replay server ===
+class ReplayHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        srv = self.server
+        delay = srv.latency + srv.rng.uniform(0, srv.jitter) if srv.jitter else srv.latency
+        if delay > 0:
+            time.sleep(delay)
+
+        key = url_key(self.path)
+        html = srv.archive.get(key)
+        status = 200
+        if html is None:
+            if key.startswith("/collections/"):
+                html = EMPTY_LISTING_HTML  # past the last recorded page: listing is exhausted
+            else:
+                html, status = NOT_FOUND_HTML, 404
+        elif key != "/collections/" and srv.rng.random() < srv.captcha_rate:
+            html = CAPTCHA_HTML
+            srv.captchas += 1
+        else:
+            html = html.replace(LIVE_ORIGIN, srv.origin)
+
+        body = html.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(archive_dir, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, captcha_rate=0.0, seed=0):
+    """Start a replay server on a background thread; returns it with `.origin` set."""
+    server = ThreadingHTTPServer((host, port), ReplayHandler)
+    server.daemon_threads = True
+    server.archive = Archive(archive_dir)
+    server.latency = latency
+    server.jitter = jitter
+    server.captcha_rate = captcha_rate
+    server.rng = random.Random(seed)
+    server.captchas = 0
+    server.origin = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record, synthesize and replay ModeSens crawl fixtures.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    synth = sub.add_parser("synth", help="build an archive from a products CSV")
+    synth.add_argument("--csv", default="results/products_final.csv")
+    synth.add_argument("--archive", default="fixtures/modesens")
+    synth.add_argument("--per-page", type=int, default=40)
+
+    replay = sub.add_parser("serve", help="replay an archive over HTTP")
+    replay.add_argument("--archive", default="fixtures/modesens")
+    replay.add_argument("--port", type=int, default=8765)
+    replay.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    replay.add_argument("--jitter", type=float, default=0.0, help="extra random seconds, uniform in [0, jitter]")
+    replay.add_argument("--captcha-rate", type=float, default=0.0, help="probability a page is replaced by a CAPTCHA")
+    replay.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == "synth":
+        archive = synthesize(args.csv, args.archive, args.per_page)
+        print(f"✅ {len(archive)} pages written to {args.archive}")
+        return
+
+    server = serve(args.archive, port=args.port, latency=args.latency, jitter=args.jitter,
+                   captcha_rate=args.captcha_rate, seed=args.seed)
+    print(f"🔁 Replaying {len(server.archive)} pages at {server.origin} (MODESENS_BASE_URL={server.origin})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,117 +1,197 @@
+import os
 import re
 import csv
-import time
-import random
 import logging
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import NoSuchElementException
-from webdriver_manager.chrome import ChromeDriverManager
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
+import instrument
+import session_pool
+import crawl_fixtures
+import discovery
+
+# Config
+OUTPUT_CSV = "products.csv"
+COLLECTIONS = [c.strip() for c in os.environ.get("CRAWL_COLLECTIONS", "/collections/").split(",") if c.strip()]
+MAX_PAGES = int(os.environ.get("CRAWL_MAX_PAGES", "500"))  # per collection, safety cap
+STALE_PAGES = int(os.environ.get("CRAWL_STALE_PAGES", "3"))  # stop a collection after N pages with nothing new (0: never)
+BLOCK_RETRIES = 3
 
-# Setup logging
-logging.basicConfig(filename="crawler.log", level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
 def extract_product_id(url):
     match = re.search(r'-([0-9]+)/?$', url)
     return match.group(1) if match else ""
 
-# Setup headless Chrome with user-agent spoofing
-options = Options()
-options.add_argument("--window-size=1280,800")
-options.add_argument("--disable-blink-features=AutomationControlled")
-options.add_argument("user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36")
-
-driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
 
-# Remove Selenium webdriver flag
-driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {
-  "source": "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"
-})
+def create_driver():
+    # Chrome with user-agent spoofing on a persistent profile, reusing any saved login
+    options = session_pool.chrome_options(
+        "crawler",
+        user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36",
+    )
+    driver = session_pool.launch_chrome(options)
+    session_pool.restore_cookies(driver)
+    return driver
 
-base_url = "https://modesens.cn/collections/"
-products_data = []
 
-for page in range(1, 4):
-    page_url = f"{base_url}?page={page}"
-    driver.get(page_url)
-    time.sleep(random.uniform(2, 4))
+def load_listing(driver, page_url):
+    """Load a listing page, backing off while it is blocked or failing; False if it never got through."""
+    for attempt in range(BLOCK_RETRIES):
+        if attempt:
+            instrument.incr("safe_get_retries")
+        try:
+            with instrument.timer("page_load", url=page_url, attempt=attempt):
+                driver.get(page_url)
+        except WebDriverException as e:
+            # e.g. the 25s page-load timeout on a slow listing
+            logging.warning(f"Failed to load listing: {page_url}, error: {e}")
+            instrument.incr("page_load_errors")
+            with instrument.timer("retry_backoff"):
+                session_pool.pause(2 ** attempt)
+            continue
+        if not session_pool.is_blocked(driver):
+            return True
+        logging.warning(f"Captcha or block on listing {page_url}.")
+        instrument.incr("captcha_blocks")
+        with instrument.timer("captcha_wait", url=page_url):
+            session_pool.pause(2 ** attempt)
+    instrument.incr("page_load_failures")
+    return False
+
+
+def crawl(driver, products_data):
+    """Crawl every collection, appending rows to `products_data` as they are scraped."""
+    seen = discovery.SeenSet()
+    for collection in COLLECTIONS:
+        crawl_collection(driver, collection, seen, products_data)
+    return products_data
+
+
+def crawl_collection(driver, collection, seen, products_data):
+    stale = 0
+
+    for page in range(1, MAX_PAGES + 1):
+        page_url = discovery.listing_url(session_pool.BASE_URL, collection, page)
+        if not load_listing(driver, page_url):
+            logging.warning(f"Listing still blocked, skipping: {page_url}")
+            stale += 1
+            if STALE_PAGES and stale >= STALE_PAGES:
+                break
+            continue
+        instrument.incr("listing_pages")
+        session_pool.pause(2, 4)
 
-    # Attempt to dismiss login popup
-    try:
-        body = driver.find_element(By.TAG_NAME, "body")
-        body.send_keys(Keys.ESCAPE)
-        time.sleep(1)
-    except Exception as e:
-        logging.warning(f"ESC to close popup failed: {e}")
+        # Attempt to dismiss login popup
+        try:
+            body = driver.find_element(By.TAG_NAME, "body")
+            body.send_keys(Keys.ESCAPE)
+            session_pool.pause(1)
+        except Exception as e:
+            logging.warning(f"ESC to close popup failed: {e}")
+        crawl_fixtures.record_driver(driver)
+
+        # Gather product links on the listing page
+        product_link_elems = driver.find_elements(By.XPATH, "//a[contains(@href, '/product/')]")
+        product_links = []
+
+        with instrument.timer("extract_listing", url=page_url):
+            for elem in product_link_elems:
+                try:
+                    href = elem.get_attribute("href")
+                    if not href:
+                        continue
+                    try:
+                        img = elem.find_element(By.TAG_NAME, "img")
+                        img_src = img.get_attribute("src")
+                    except:
+                        img_src = ""
+                    product_links.append((href, img_src))
+                except Exception as e:
+                    logging.warning(f"Link extraction failed: {e}")
+
+        if not product_links:
+            logging.info(f"{collection} exhausted after {page - 1} pages.")
+            break
+
+        # Visit each product page (note: availability may be blocked)
+        fresh = 0
+        for product_url, cover_url in product_links:
+            product_id = extract_product_id(product_url)
+            if not product_id or not seen.add(product_id):
+                continue  # not a product, or already visited from another page
+            fresh += 1
 
-    # Gather product links on the listing page
-    product_link_elems = driver.find_elements(By.XPATH, "//a[contains(@href, '/product/')]")
-    product_links = []
+            try:
+                with instrument.timer("page_load", url=product_url):
+                    driver.get(product_url)
+                session_pool.pause(2, 4)
+            except Exception as e:
+                logging.warning(f"Failed to load product page: {product_url}, error: {e}")
+                instrument.incr("page_load_failures")
+                continue
 
-    for elem in product_link_elems:
-        try:
-            href = elem.get_attribute("href")
-            if not href:
+            # Check for captcha or block
+            if "captcha" in driver.page_source.lower() or "403" in driver.title:
+                logging.warning(f"Captcha or block on product {product_url}. Skipping.")
+                instrument.incr("captcha_blocks")
                 continue
+            crawl_fixtures.record_driver(driver)
+
+            # Extract availability info (may be blocked)
+            availability_ids = []
+            availability_urls = []
+
             try:
-                img = elem.find_element(By.TAG_NAME, "img")
-                img_src = img.get_attribute("src")
+                with instrument.timer("extract_product", product_id=product_id):
+                    buy_links = driver.find_elements(By.XPATH, "//a[contains(text(), '浏览商店')]")
+                    for idx, a in enumerate(buy_links):
+                        url = a.get_attribute("href")
+                        availability_urls.append(url or "")
+                        availability_ids.append(f"store_{idx+1}")
             except:
-                img_src = ""
-            product_links.append((href, img_src))
-        except Exception as e:
-            logging.warning(f"Link extraction failed: {e}")
+                pass  # silently skip if missing
 
-    # Visit each product page (note: availability may be blocked)
-    for product_url, cover_url in product_links:
-        product_id = extract_product_id(product_url)
-        if not product_id:
-            continue
+            products_data.append({
+                "product_id": product_id,
+                "avail_ids": ";".join(availability_ids),
+                "product_cover_url": cover_url,
+                "avail_urls": ";".join(availability_urls),
+            })
 
-        try:
-            driver.get(product_url)
-            time.sleep(random.uniform(2, 4))
-        except Exception as e:
-            logging.warning(f"Failed to load product page: {product_url}, error: {e}")
-            continue
+            instrument.incr("products_saved")
+            logging.info(f"Saved product {product_id} with {len(availability_ids)} availabilities.")
+            session_pool.pause(2, 5)
 
-        # Check for captcha or block
-        if "captcha" in driver.page_source.lower() or "403" in driver.title:
-            logging.warning(f"Captcha or block on product {product_url}. Skipping.")
-            continue
+        stale = 0 if fresh else stale + 1
+        if STALE_PAGES and stale >= STALE_PAGES:
+            logging.info(f"{collection}: nothing new on the last {stale} pages, stopping.")
+            break
 
-        # Extract availability info (may be blocked)
-        availability_ids = []
-        availability_urls = []
 
-        try:
-            buy_links = driver.find_elements(By.XPATH, "//a[contains(text(), '浏览商店')]")
-            for idx, a in enumerate(buy_links):
-                url = a.get_attribute("href")
-                availability_urls.append(url or "")
-                availability_ids.append(f"store_{idx+1}")
-        except:
-            pass  # silently skip if missing
-
-        products_data.append({
-            "product_id": product_id,
-            "avail_ids": ";".join(availability_ids),
-            "product_cover_url": cover_url,
-            "avail_urls": ";".join(availability_urls),
-        })
-
-        logging.info(f"Saved product {product_id} with {len(availability_ids)} availabilities.")
-        time.sleep(random.uniform(2, 5))
-
-# Save to CSV
-with open("products.csv", "w", newline='', encoding="utf-8") as f:
-    writer = csv.DictWriter(f, fieldnames=["product_id", "avail_ids", "product_cover_url", "avail_urls"])
-    writer.writeheader()
-    for row in products_data:
-        writer.writerow(row)
-
-driver.quit()
-print(f"✅ Done. Saved {len(products_data)} products to products.csv.")
+def save_csv(products_data):
+    with open(OUTPUT_CSV, "w", newline='', encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["product_id", "avail_ids", "product_cover_url", "avail_urls"])
+        writer.writeheader()
+        for row in products_data:
+            writer.writerow(row)
+
+
+def main():
+    # Setup logging
+    logging.basicConfig(filename="crawler.log", level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    instrument.setup("crawler")
+
+    driver = create_driver()
+    products_data = []
+    try:
+        crawl(driver, products_data)
+    finally:
+        driver.quit()
+        # Save to CSV, including whatever was scraped before an error
+        save_csv(products_data)
+
+    print(f"✅ Done. Saved {len(products_data)} products to {OUTPUT_CSV}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import math
+import heapq
+import hashlib
+import itertools
+import threading
+from array import array
+from bisect import bisect_left
+import instrument
+
+
+def listing_url(base_url, collection, page):
+    """`collection` is a path such as /collections/ or /designers/zimmermann/."""
+    path = collection if collection.startswith("/") else f"/{collection}"
+    sep = "&" if "?" in path else "?"
+    return f"{base_url}{path}{sep}page={page}"
+
+
+class BloomFilter:
+    def __init__(self, capacity=100_000, error_rate=0.01):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(self.size // 8 + 1)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(str(key).encode("ascii"), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class SeenSet:
+    """Compact, thread-safe set of numeric product ids.
+
+    A Bloom filter answers most "never seen" lookups without touching the
+    exact store; the exact store is a sorted uint64 array (8 bytes per id)
+    plus a small set of recent additions that is merged in periodically.
+    """
+
+    MERGE_AT = 4096
+
+    def __init__(self, ids=(), capacity=100_000, error_rate=0.01):
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.sorted = array("Q")
+        self.recent = set()
+        self.lock = threading.Lock()
+        for pid in ids:
+            self.add(pid)
+
+    def _merge(self):
+        self.sorted = array("Q", sorted(itertools.chain(self.sorted, self.recent)))
+        self.recent = set()
+
+    def _exact(self, key):
+        if key in self.recent:
+            return True
+        i = bisect_left(self.sorted, key)
+        return i < len(self.sorted) and self.sorted[i] == key
+
+    def __contains__(self, pid):
+        key = int(pid)
+        with self.lock:
+            return key in self.bloom and self._exact(key)
+
+    def add(self, pid):
+        """Add `pid`; returns False if it was already present."""
+        key = int(pid)
+        with self.lock:
+            if key in self.bloom and self._exact(key):
+                return False
+            self.bloom.add(key)
+            self.recent.add(key)
+            if len(self.recent) >= self.MERGE_AT:
+                self._merge()
+            return True
+
+    def __len__(self):
+        with self.lock:
+            return len(self.sorted) + len(self.recent)
+
+
+class Frontier:
+    """Deduplicated product queue fed by listing discovery.
+
+    Each product id is queued at most once per run. Products already known
+    from earlier runs are dropped, or with `refresh` queued behind every
+    unseen product, where they still count as progress for the page.
+    `pop()` blocks until work arrives and returns None once the frontier
+    is closed and drained.
+    """
+
+    UNSEEN, KNOWN = 0, 1
+
+    def __init__(self, known=None, refresh=False):
+        self.known = known
+        self.refresh = refresh
+        self.queued = SeenSet()
+        self.heap = []
+        self.seq = itertools.count()
+        self.cond = threading.Condition()
+        self.closed = False
+
+    def push(self, product_id, item):
+        """Queue `item`; returns True if it was queued, i.e. it counts as progress for discovery."""
+        if not self.queued.add(product_id):
+            instrument.incr("frontier_duplicates")
+            return False
+        priority = self.UNSEEN
+        if self.known is not None and product_id in self.known:
+            if not self.refresh:
+                instrument.incr("frontier_known")
+                return False
+            priority = self.KNOWN
+        with self.cond:
+            heapq.heappush(self.heap, (priority, next(self.seq), product_id, item))
+            self.cond.notify()
+        instrument.incr("frontier_queued")
+        return True
+
+    def pop(self):
+        with self.cond:
+            while not self.heap and not self.closed:
+                self.cond.wait()
+            if not self.heap:
+                return None
+            _, _, product_id, item = heapq.heappop(self.heap)
+            return product_id, item
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
@@ -1,30 +1,38 @@
 import csv
 import os
+import logging
+import instrument
 
 PRODUCT_CSV = "results/products_final.csv"
 SIMILARITY_CSV = "results/similarity_results.csv"
 OUTPUT_HTML = "similarity_report.html"
 
-# Load product cover URLs
-product_images = {}
-with open(PRODUCT_CSV, newline='', encoding="utf-8") as f:
-    reader = csv.DictReader(f)
-    for row in reader:
-        product_images[row["product_id"]] = row["cover_url"]
-
-# Load similarity results
-similar_data = {}
-with open(SIMILARITY_CSV, newline='', encoding="utf-8") as f:
-    reader = csv.reader(f)
-    next(reader)  # skip header
-    for row in reader:
-        pid = row[0]
-        sim_ids = row[1].split(";") if len(row) > 1 else []
-        similar_data[pid] = sim_ids
-
-# Start HTML
-title = "Product Similarity Viewer"
-html = f"""
+
+def load_product_images(product_csv=PRODUCT_CSV):
+    product_images = {}
+    with open(product_csv, newline='', encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            product_images[row["product_id"]] = row["cover_url"]
+    return product_images
+
+
+def load_similarity(similarity_csv=SIMILARITY_CSV):
+    similar_data = {}
+    with open(similarity_csv, newline='', encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader)  # skip header
+        for row in reader:
+            pid = row[0]
+            sim_ids = row[1].split(";") if len(row) > 1 else []
+            similar_data[pid] = sim_ids
+    return similar_data
+
+
+def render_report(product_images, similar_data):
+    # Start HTML
+    title = "Product Similarity Viewer"
+    html = f"""
 <!DOCTYPE html>
 <html lang=\"en\">
 <head>
@@ -72,32 +80,48 @@ html = f"""
 <h1>\U0001f50d {title}</h1>
 """
 
-# Generate blocks
-for pid, sim_ids in similar_data.items():
-    if pid not in product_images:
-        continue
-
-    html += f'<div class="product-block">\n'
-    html += f'<div class="product-title">Main Product: <a href="https://modesens.cn/product/{pid}/" target="_blank">{pid}</a></div>\n'
-    html += '<div class="images main">\n'
-    html += f'<a href="https://modesens.cn/product/{pid}/" target="_blank">'
-    html += f'<img src="{product_images[pid]}" alt="{pid}" class="highlight"><div class="caption">{pid}</div></a>\n'
-    html += '</div>\n'
-
-    html += f'<div class="product-title">Top {len(sim_ids)} Similar Products:</div>\n'
-    html += '<div class="images">\n'
-    for i, sid in enumerate(sim_ids):
-        if sid in product_images:
-            cls = "highlight" if i == 0 else ""
-            html += f'<a href="https://modesens.cn/product/{sid}/" target="_blank">'
-            html += f'<img src="{product_images[sid]}" class="{cls}" alt="{sid}"><div class="caption">{sid}</div></a>\n'
-    html += '</div></div>\n'
-
-# End HTML
-html += "</body></html>"
-
-# Save output
-with open(OUTPUT_HTML, "w", encoding="utf-8") as f:
-    f.write(html)
-
-print(f"✅ Report generated: {OUTPUT_HTML}")
+    # Generate blocks
+    with instrument.timer("render", products=len(similar_data)):
+        for pid, sim_ids in similar_data.items():
+            if pid not in product_images:
+                continue
+
+            html += f'<div class="product-block">\n'
+            html += f'<div class="product-title">Main Product: <a href="https://modesens.cn/product/{pid}/" target="_blank">{pid}</a></div>\n'
+            html += '<div class="images main">\n'
+            html += f'<a href="https://modesens.cn/product/{pid}/" target="_blank">'
+            html += f'<img src="{product_images[pid]}" alt="{pid}" class="highlight"><div class="caption">{pid}</div></a>\n'
+            html += '</div>\n'
+
+            html += f'<div class="product-title">Top {len(sim_ids)} Similar Products:</div>\n'
+            html += '<div class="images">\n'
+            for i, sid in enumerate(sim_ids):
+                if sid in product_images:
+                    cls = "highlight" if i == 0 else ""
+                    html += f'<a href="https://modesens.cn/product/{sid}/" target="_blank">'
+                    html += f'<img src="{product_images[sid]}" class="{cls}" alt="{sid}"><div class="caption">{sid}</div></a>\n'
+            html += '</div></div>\n'
+
+    # End HTML
+    html += "</body></html>"
+    return html
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    instrument.setup("generate_html")
+
+    # Load product cover URLs and similarity results
+    product_images = load_product_images()
+    similar_data = load_similarity()
+    html = render_report(product_images, similar_data)
+
+    # Save output
+    with open(OUTPUT_HTML, "w", encoding="utf-8") as f:
+        f.write(html)
+
+    print(f"✅ Report generated: {OUTPUT_HTML}")
+
+
+if __name__ == "__main__":
+    main()
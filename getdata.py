@@ -1,18 +1,18 @@
 import os
-import time
+import sys
 import csv
 import re
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
 from seleniumwire import webdriver  # for header control
+import instrument
+import session_pool
+import crawl_fixtures
 
-# === Chrome Setup ===
-options = Options()
-options.add_argument("--window-size=1280,800")
-options.add_argument("--disable-blink-features=AutomationControlled")
-options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36")
+# Config
+CSV_PATH = "results/data.csv"
+CSV_FIELDS = ["product_id", "cover_url", "avail_ids", "avail_urls"]
 
-seleniumwire_options = {
+SELENIUMWIRE_OPTIONS = {
     "exclude_hosts": [
         "cdn.shopify.com", "images.lvrcdn.com", "img.the-fashion-square.com",
         "img.mytheresa.com", "product-image-sts.intramirror.com",
@@ -21,44 +21,65 @@ seleniumwire_options = {
     ]
 }
 
-# === Driver Init ===
-driver = webdriver.Chrome(options=options, seleniumwire_options=seleniumwire_options)
-driver.set_page_load_timeout(25)
 
-# === CSV Setup ===
-os.makedirs("results", exist_ok=True)
-csv_path = "results/data.csv"
-csv_fields = ["product_id", "cover_url", "avail_ids", "avail_urls"]
-csv_file = open(csv_path, "w", newline='', encoding="utf-8")
-csv_writer = csv.DictWriter(csv_file, fieldnames=csv_fields)
-csv_writer.writeheader()
+def create_driver():
+    options = session_pool.chrome_options(
+        "getdata",
+        user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36",
+    )
+    driver = session_pool.launch_chrome(
+        options, driver_cls=webdriver.Chrome, seleniumwire_options=SELENIUMWIRE_OPTIONS
+    )
+    session_pool.ensure_login(driver)
+    return driver
 
-def human_scroll():
+
+@instrument.timed("scroll")
+def human_scroll(driver):
     height = driver.execute_script("return document.body.scrollHeight")
     for y in range(0, height, 400):
         driver.execute_script(f"window.scrollTo(0, {y});")
-        time.sleep(0.5)
+        session_pool.pause(0.5)
 
-def extract_product(product_id):
-    url = f"https://modesens.cn/product/{product_id}/"
-    driver.get(url)
-    input("🧭 请滑动页面、处理验证码，加载完毕后按 [ENTER]...")
 
-    human_scroll()
-    time.sleep(1.5)
+def load_product(driver, url):
+    for attempt in range(session_pool.BLOCK_RETRIES):
+        if attempt:
+            instrument.incr("safe_get_retries")
+        with instrument.timer("page_load", url=url, attempt=attempt):
+            driver.get(url)
+        if not session_pool.is_blocked(driver):
+            return True
+        session_pool.wait_out_block(url, attempt)
+        if session_pool.WAIT_ON_BLOCK and not session_pool.is_blocked(driver):
+            return True  # solved by hand in the open page
+    instrument.incr("page_load_failures")
+    return False
 
-    try:
-        img = driver.find_element(By.CSS_SELECTOR, "img")
-        cover_url = img.get_attribute("src") or ""
-    except:
-        cover_url = ""
-
-    avail_ids, avail_urls = [], []
-    for avail in driver.find_elements(By.CSS_SELECTOR, "div.avail[id^='a']"):
-        aid = avail.get_attribute("id")
-        if aid:
-            avail_ids.append(aid)
-            avail_urls.append(f"https://modesens.cn/product/avail/{aid[1:]}/getlink/")
+
+def extract_product(driver, csv_writer, product_id):
+    url = f"{session_pool.BASE_URL}/product/{product_id}/"
+    if not load_product(driver, url):
+        print(f"❌ 页面仍被拦截，跳过 {product_id}")
+        return
+
+    human_scroll(driver)
+    session_pool.pause(1.5)
+    crawl_fixtures.record_driver(driver)
+
+    with instrument.timer("extract_product", product_id=product_id):
+        try:
+            img = driver.find_element(By.CSS_SELECTOR, "img")
+            cover_url = img.get_attribute("src") or ""
+        except:
+            cover_url = ""
+
+        avail_ids, avail_urls = [], []
+        for avail in driver.find_elements(By.CSS_SELECTOR, "div.avail[id^='a']"):
+            aid = avail.get_attribute("id")
+            if aid:
+                avail_ids.append(aid)
+                avail_urls.append(f"https://modesens.cn/product/avail/{aid[1:]}/getlink/")
 
     print("\n📦 结果如下：")
     print("product_id:", product_id)
@@ -73,10 +94,27 @@ def extract_product(product_id):
         "avail_ids": ";".join(avail_ids),
         "avail_urls": ";".join(avail_urls)
     })
-    print(f"✅ 已保存到 {csv_path}")
+    instrument.incr("products_saved")
+    print(f"✅ 已保存到 {CSV_PATH}")
+
+
+def main():
+    instrument.setup("getdata")
+    pid = sys.argv[1] if len(sys.argv) > 1 else input("请输入 product_id（如：109582629）: ").strip()
+    driver = create_driver()
+
+    # === CSV Setup ===
+    os.makedirs("results", exist_ok=True)
+    csv_file = open(CSV_PATH, "w", newline='', encoding="utf-8")
+    csv_writer = csv.DictWriter(csv_file, fieldnames=CSV_FIELDS)
+    csv_writer.writeheader()
+
+    try:
+        extract_product(driver, csv_writer, pid)
+    finally:
+        csv_file.close()
+        driver.quit()
+
 
 if __name__ == "__main__":
-    pid = input("请输入 product_id（如：109582629）: ").strip()
-    extract_product(pid)
-    csv_file.close()
-    driver.quit()
+    main()
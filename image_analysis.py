@@ -0,0 +1,126 @@
+import os
+import sys
+import importlib
+import instrument
+
+# Heavy third-party modules are imported on first use, not at import time, so
+# scripts that skip a stage never pay for it and worker start-up stays cheap.
+HEAVY_MODULES = ("requests", "numpy", "PIL.Image", "imagehash", "cv2", "skimage.metrics")
+
+THUMB_SIZE = 200
+
+
+def lazy(name):
+    module = sys.modules.get(name)
+    if module is None:
+        with instrument.timer("import", module=name):
+            module = importlib.import_module(name)
+    return module
+
+
+def preload(names=HEAVY_MODULES):
+    """Import heavy modules up front, e.g. in a parent process before forking workers."""
+    for name in names:
+        lazy(name)
+
+
+def init_worker(run_name=None, names=HEAVY_MODULES):
+    """Pool initializer: one OpenCV thread per worker and a single import per process.
+
+    With the fork start method the parent has usually called `preload()`
+    already and this only pins the thread count; with spawn it imports the
+    modules once per worker instead of once per task.
+    """
+    instrument.reset()  # a forked worker starts with a copy of the parent's totals
+    if run_name:
+        instrument.setup(run_name, worker=True)
+    preload(names)
+    if "cv2" in names:
+        lazy("cv2").setNumThreads(1)
+
+
+# === Download ===
+def download_image(url, save_path):
+    if os.path.exists(save_path):
+        instrument.incr("download_cached")
+        return save_path
+    try:
+        with instrument.timer("download", url=url):
+            r = lazy("requests").get(url, timeout=10)
+        if r.status_code == 200:
+            with open(save_path, "wb") as f:
+                f.write(r.content)
+            instrument.incr("download_bytes", len(r.content))
+            return save_path
+    except:
+        pass
+    instrument.incr("download_errors")
+    return None
+
+
+# === Decode / hash / compare ===
+def open_gray(path):
+    with instrument.timer("decode"):
+        with lazy("PIL.Image").open(path) as img:
+            return img.convert("L")
+
+
+def phash_bits(img):
+    with instrument.timer("hash"):
+        return lazy("imagehash").phash(img).hash
+
+
+def ssim(img1, img2):
+    return lazy("skimage.metrics").structural_similarity(img1, img2)
+
+
+def compute_similarity(img1_path, img2_path):
+    cv2 = lazy("cv2")
+    Image = lazy("PIL.Image")
+    imagehash = lazy("imagehash")
+    try:
+        # dHash
+        with instrument.timer("decode"):
+            pil1 = Image.open(img1_path).convert("RGB")
+            pil2 = Image.open(img2_path).convert("RGB")
+        with instrument.timer("hash"):
+            hash1 = imagehash.dhash(pil1)
+            hash2 = imagehash.dhash(pil2)
+        dhash_diff = hash1 - hash2
+
+        # SSIM
+        with instrument.timer("decode"):
+            img1 = cv2.imread(img1_path)
+            img2 = cv2.imread(img2_path)
+        with instrument.timer("compare"):
+            img1 = cv2.resize(img1, (THUMB_SIZE, THUMB_SIZE))
+            img2 = cv2.resize(img2, (THUMB_SIZE, THUMB_SIZE))
+            gray1 = cv2.cvtColor(img1, cv2.COLOR_BGR2GRAY)
+            gray2 = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY)
+            ssim_score = ssim(gray1, gray2)
+        return dhash_diff, ssim_score
+    except Exception as e:
+        return None, None
+
+
+def compare_product(pid, cover_url, avail_urls, product_folder, avail_folder):
+    """Download a product cover and its availability covers, and score each pair.
+
+    Returns (product_img, [(ssim_score, dhash_diff, avail_img), ...]) sorted by
+    SSIM, best match first. Safe to call from a pool worker.
+    """
+    product_img = f"{product_folder}/{pid}.jpg"
+    download_image(cover_url, product_img)
+
+    comparisons = []
+    for i, a_url in enumerate(avail_urls):
+        a_img = f"{avail_folder}/{pid}_{i}.jpg"
+        download_image(a_url, a_img)
+
+        dhash_diff, ssim_score = compute_similarity(product_img, a_img)
+        if dhash_diff is None or ssim_score is None:
+            continue
+        comparisons.append((ssim_score, int(dhash_diff), a_img))
+
+    comparisons.sort(key=lambda x: -x[0])  # SSIM descending
+    return product_img, comparisons
@@ -0,0 +1,176 @@
+import os
+import sys
+import json
+import time
+import atexit
+import logging
+import threading
+import functools
+from contextlib import contextmanager
+from collections import defaultdict
+
+# Config
+METRICS_DIR = os.environ.get("METRICS_DIR", "results/metrics")
+PROFILE_MODE = os.environ.get("METRICS_PROFILE", "").lower()  # "", "cprofile" or "py-spy"
+PERCENTILES = (50, 90, 99)
+
+_lock = threading.Lock()
+_state = {"run": None, "file": None, "profiler": None}
+_timings = defaultdict(list)
+_counters = defaultdict(float)
+
+
+def setup(run_name, worker=False):
+    """Start collecting metrics for this script, one call per process.
+
+    Events go to results/metrics/<run_name>.jsonl as they happen and a
+    summary line with percentiles is appended when the process exits.
+    A `worker` process only writes events; its parent folds the worker's
+    totals into the summary with `drain()` and `merge()`.
+    """
+    if _state["run"] is not None:
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    _state["run"] = run_name
+    _state["file"] = open(os.path.join(METRICS_DIR, f"{run_name}.jsonl"), "a", encoding="utf-8")
+    _emit({"event": "start", "pid": os.getpid(), "argv": sys.argv})
+    if worker:
+        return
+    _start_profiler(run_name)
+    atexit.register(finish)
+
+
+def _emit(record):
+    if _state["file"] is None:
+        return
+    record = {"ts": round(time.time(), 3), "run": _state["run"], **record}
+    with _lock:
+        _state["file"].write(json.dumps(record, ensure_ascii=False) + "\n")
+        _state["file"].flush()
+
+
+@contextmanager
+def timer(stage, **fields):
+    """Time a block as one occurrence of `stage`; extra fields are written with the event."""
+    start = time.perf_counter()
+    ok = True
+    try:
+        yield
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        observe(stage, time.perf_counter() - start, ok=ok, **fields)
+
+
+def timed(stage):
+    """Decorator form of `timer`."""
+    def wrap(func):
+        @functools.wraps(func)
+        def inner(*args, **kwargs):
+            with timer(stage):
+                return func(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def observe(stage, secs, **fields):
+    with _lock:
+        _timings[stage].append(secs)
+    _emit({"event": "timing", "stage": stage, "secs": round(secs, 6), **fields})
+
+
+def incr(name, value=1):
+    with _lock:
+        _counters[name] += value
+
+
+def reset():
+    """Forget collected timings and counters, e.g. those a forked worker inherited."""
+    with _lock:
+        _timings.clear()
+        _counters.clear()
+
+
+def drain():
+    """Return this process's raw timings and counters and clear them, for `merge()` in the parent."""
+    with _lock:
+        snapshot = {"timings": {stage: list(values) for stage, values in _timings.items()},
+                    "counters": dict(_counters)}
+        _timings.clear()
+        _counters.clear()
+    return snapshot
+
+
+def merge(snapshot):
+    # The worker already wrote its timing events, so only the totals are added here
+    with _lock:
+        for stage, values in snapshot["timings"].items():
+            _timings[stage].extend(values)
+        for name, value in snapshot["counters"].items():
+            _counters[name] += value
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = (len(ordered) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summary():
+    with _lock:
+        timings = {stage: list(values) for stage, values in _timings.items()}
+        counters = dict(_counters)
+    stages = {}
+    for stage, values in timings.items():
+        stats = {"count": len(values), "total": round(sum(values), 4)}
+        for pct in PERCENTILES:
+            stats[f"p{pct}"] = round(percentile(values, pct), 4)
+        stages[stage] = stats
+    return {"stages": stages, "counters": counters}
+
+
+def finish():
+    if _state["file"] is None:
+        return
+    _stop_profiler()
+    result = summary()
+    _emit({"event": "summary", **result})
+    for stage, stats in sorted(result["stages"].items()):
+        logging.info(f"⏱️ {stage}: n={stats['count']} total={stats['total']}s "
+                     + " ".join(f"p{p}={stats[f'p{p}']}s" for p in PERCENTILES))
+    for name, value in sorted(result["counters"].items()):
+        logging.info(f"🔢 {name}: {value:g}")
+    with _lock:
+        _state["file"].close()
+        _state["file"] = None
+
+
+# === Profiling hooks (opt-in via METRICS_PROFILE) ===
+def _start_profiler(run_name):
+    if PROFILE_MODE == "cprofile":
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        _state["profiler"] = profiler
+    elif PROFILE_MODE == "py-spy":
+        # py-spy attaches from outside, so just make the target easy to find
+        pid_path = os.path.join(METRICS_DIR, f"{run_name}.pid")
+        with open(pid_path, "w") as f:
+            f.write(str(os.getpid()))
+        logging.info(f"🔬 Attach with: py-spy record -p {os.getpid()} -o {METRICS_DIR}/{run_name}.svg")
+
+
+def _stop_profiler():
+    profiler = _state["profiler"]
+    if profiler is None:
+        return
+    profiler.disable()
+    prof_path = os.path.join(METRICS_DIR, f"{_state['run']}.prof")
+    profiler.dump_stats(prof_path)
+    _state["profiler"] = None
+    logging.info(f"🔬 cProfile stats saved to: {prof_path}")
@@ -0,0 +1,194 @@
+import os
+import sys
+import glob
+import json
+import hashlib
+import logging
+import argparse
+import subprocess
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Config
+CACHE_FILE = "results/.pipeline_cache.json"
+DEFAULT_JOBS = 2
+
+# A stage runs `module.main()` in its own interpreter. Inputs and outputs are
+# file paths or glob patterns; a stage depends on every stage whose outputs it
+# reads, and is skipped when its input fingerprint matches the last run.
+# `sources` are the local modules it imports, so edits to them re-run it too;
+# `always_run` stages (the live crawl) are never skipped.
+Stage = namedtuple("Stage", ["name", "module", "inputs", "outputs", "interactive", "sources", "always_run"],
+                   defaults=((), False))
+
+STAGES = [
+    Stage("crawl", "task1new", [], ["results/products_final.csv"], True,
+          sources=("instrument", "session_pool", "crawl_fixtures", "discovery"), always_run=True),
+    Stage("download", "task2Image", ["results/products_final.csv"], ["images/*.jpg"], False,
+          sources=("instrument",)),
+    Stage("similarity", "task2_similarity_grouped",
+          ["results/products_final.csv", "images/*.jpg"], ["results/similarity_results.csv"], False,
+          sources=("instrument", "thumb_store", "image_analysis")),
+    Stage("report", "generate_html",
+          ["results/products_final.csv", "results/similarity_results.csv"], ["similarity_report.html"], False,
+          sources=("instrument",)),
+    Stage("avail", "analyze_images", ["results/products_final.csv"], ["results/task2_similarity_report.html"], False,
+          sources=("instrument", "image_analysis")),
+]
+
+
+def stage_dependencies(stages):
+    producers = {out: stage.name for stage in stages for out in stage.outputs}
+    return {
+        stage.name: {producers[i] for i in stage.inputs if i in producers and producers[i] != stage.name}
+        for stage in stages
+    }
+
+
+# === Fingerprints ===
+def file_digest(path, memo):
+    # Content hash, memoised on (size, mtime) so unchanged files are not re-read
+    st = os.stat(path)
+    key = [st.st_size, st.st_mtime_ns]
+    cached = memo.get(path)
+    if cached and cached[:2] == key:
+        return cached[2]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    memo[path] = key + [h.hexdigest()]
+    return memo[path][2]
+
+
+def fingerprint(patterns, memo):
+    """Hash the contents of every file matched by `patterns`, or None if one matches nothing."""
+    h = hashlib.sha256()
+    for pattern in patterns:
+        paths = sorted(glob.glob(pattern))
+        if not paths:
+            return None
+        for path in paths:
+            h.update(path.encode("utf-8"))
+            h.update(file_digest(path, memo).encode("ascii"))
+    return h.hexdigest()
+
+
+def load_cache():
+    if not os.path.exists(CACHE_FILE):
+        return {"stages": {}, "files": {}}
+    with open(CACHE_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_cache(cache):
+    os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
+    tmp_path = CACHE_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, CACHE_FILE)
+
+
+def stage_inputs(stage):
+    # The stage's own source and the local modules it uses count as inputs, so code changes re-run it
+    return stage.inputs + [f"{module}.py" for module in (stage.module, *stage.sources)]
+
+
+# === Runner ===
+def run_stage(stage):
+    cmd = [sys.executable, "-c", f"import {stage.module}; {stage.module}.main()"]
+    stdin = None if stage.interactive else subprocess.DEVNULL
+    return subprocess.run(cmd, stdin=stdin).returncode
+
+
+def run_pipeline(selected, force=False, jobs=DEFAULT_JOBS):
+    stages = {stage.name: stage for stage in STAGES if stage.name in selected}
+    deps = {name: d & set(stages) for name, d in stage_dependencies(STAGES).items() if name in stages}
+    cache = load_cache()
+    memo = cache["files"]
+
+    pending = dict(stages)
+    running = {}
+    done, failed = set(), set()
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            # Interactive stages need the terminal to themselves
+            blocked = any(stage.interactive for stage, _ in running.values())
+            for name, stage in ([] if blocked else list(pending.items())):
+                if deps[name] & failed:
+                    logging.error(f"⏭️ {name}: skipped, upstream stage failed")
+                    failed.add(name)
+                    del pending[name]
+                    continue
+                if not deps[name] <= done or (stage.interactive and running):
+                    continue
+
+                del pending[name]
+                in_fp = fingerprint(stage_inputs(stage), memo)
+                if in_fp is None:
+                    logging.error(f"❌ {name}: missing inputs {stage.inputs}")
+                    failed.add(name)
+                    continue
+                last = cache["stages"].get(name, {})
+                if (not force and not stage.always_run and last.get("inputs") == in_fp
+                        and last.get("outputs") == fingerprint(stage.outputs, memo)):
+                    logging.info(f"✅ {name}: up to date, skipping")
+                    done.add(name)
+                    continue
+
+                logging.info(f"▶️ {name}: running {stage.module}.main()")
+                running[pool.submit(run_stage, stage)] = (stage, in_fp)
+                if stage.interactive:
+                    break
+
+            if not running:
+                if pending and not any(deps[n] <= done or deps[n] & failed for n in pending):
+                    raise RuntimeError(f"Unresolvable stage dependencies: {sorted(pending)}")
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, in_fp = running.pop(future)
+                code = future.result()
+                if code != 0:
+                    logging.error(f"❌ {stage.name}: exited with code {code}")
+                    failed.add(stage.name)
+                    continue
+                cache["stages"][stage.name] = {"inputs": in_fp, "outputs": fingerprint(stage.outputs, memo)}
+                save_cache(cache)
+                logging.info(f"✅ {stage.name}: done")
+                done.add(stage.name)
+
+    return not failed
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    names = [stage.name for stage in STAGES]
+
+    parser = argparse.ArgumentParser(description="Run the ModeSens crawl and similarity pipeline.")
+    parser.add_argument("stages", nargs="*", help=f"stages to run, any of: {', '.join(names)} (default: all)")
+    parser.add_argument("--force", action="store_true", help="re-run stages even if their inputs are unchanged")
+    parser.add_argument("--skip", action="append", default=[], metavar="STAGE",
+                        help="leave a stage out, e.g. --skip crawl to reuse the saved crawl (repeatable)")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_JOBS, help="max stages running at once")
+    parser.add_argument("--list", action="store_true", help="show stages and their dependencies")
+    args = parser.parse_args()
+    unknown = (set(args.stages) | set(args.skip)) - set(names)
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(sorted(unknown))}")
+
+    if args.list:
+        deps = stage_dependencies(STAGES)
+        for stage in STAGES:
+            after = ", ".join(sorted(deps[stage.name])) or "-"
+            print(f"{stage.name:<11} {stage.module:<26} after: {after}")
+        return
+
+    ok = run_pipeline(set(args.stages or names) - set(args.skip), force=args.force, jobs=args.jobs)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
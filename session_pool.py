@@ -0,0 +1,295 @@
+import os
+import json
+import time
+import queue
+import random
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import instrument
+
+# Config
+SESSION_DIR = os.environ.get("SESSION_DIR", "results/.session")
+PROFILE_DIR = os.path.join(SESSION_DIR, "profiles")
+COOKIES_FILE = os.path.join(SESSION_DIR, "cookies.json")
+DRIVER_PATH_FILE = os.path.join(SESSION_DIR, "chromedriver_path")
+BASE_URL = os.environ.get("MODESENS_BASE_URL", "https://modesens.cn").rstrip("/")  # point at a replay server offline
+LOGIN_URL = f"{BASE_URL}/collections/"
+DELAY_SCALE = float(os.environ.get("CRAWL_DELAY_SCALE", "1"))  # 0 disables politeness delays, e.g. for benchmarks
+RECYCLE_AFTER = int(os.environ.get("SESSION_RECYCLE_AFTER", "150"))  # pages per browser before a restart
+WAIT_ON_BLOCK = os.environ.get("CRAWL_WAIT_ON_BLOCK", "1") == "1"  # 0: back off and retry instead of prompting
+BLOCK_RETRIES = 3
+HEADLESS = os.environ.get("CRAWL_HEADLESS", "0") == "1"  # 1: force headless browsers, e.g. without a display
+STEALTH_JS = "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"
+
+_driver_path_lock = threading.Lock()
+_cookie_lock = threading.Lock()
+
+
+def looks_blocked(title, html):
+    return "403" in title or "登录" in title or "captcha" in html.lower()
+
+
+def is_blocked(driver):
+    return looks_blocked(driver.title, driver.page_source)
+
+
+def wait_out_block(url, attempt, wait_on_block=WAIT_ON_BLOCK):
+    """Record a block on `url`, then wait for a manual fix or back off before the next attempt."""
+    logging.warning(f"🔐 CAPTCHA or block detected: {url}")
+    instrument.incr("captcha_blocks")
+    with instrument.timer("captcha_wait", url=url):
+        if wait_on_block:
+            input("🛑 请手动解决问题后按 [ENTER] 继续...")
+        else:
+            pause(2 ** attempt + random.uniform(0.5, 1.5))
+
+
+def pause(low, high=None):
+    """Politeness delay between browser actions, scaled by CRAWL_DELAY_SCALE."""
+    secs = low if high is None else random.uniform(low, high)
+    if DELAY_SCALE > 0:
+        time.sleep(secs * DELAY_SCALE)
+
+
+# === Chromedriver ===
+def chromedriver_path(refresh=False):
+    """Resolve chromedriver once and reuse the path on later runs; `refresh` drops the cached path."""
+    with _driver_path_lock:
+        if refresh and os.path.exists(DRIVER_PATH_FILE):
+            os.remove(DRIVER_PATH_FILE)
+        if os.path.exists(DRIVER_PATH_FILE):
+            with open(DRIVER_PATH_FILE, encoding="utf-8") as f:
+                path = f.read().strip()
+            if os.path.exists(path):
+                return path
+        from webdriver_manager.chrome import ChromeDriverManager
+        with instrument.timer("driver_resolve"):
+            path = ChromeDriverManager().install()
+        os.makedirs(SESSION_DIR, exist_ok=True)
+        with open(DRIVER_PATH_FILE, "w", encoding="utf-8") as f:
+            f.write(path)
+        return path
+
+
+def chrome_options(profile, user_agent=None, headless=False, window_size=(1280, 800)):
+    from selenium.webdriver.chrome.options import Options
+    options = Options()
+    options.add_argument(f"--user-data-dir={os.path.abspath(os.path.join(PROFILE_DIR, profile))}")
+    if user_agent:
+        options.add_argument(f"--user-agent={user_agent}")
+    options.add_argument(f"--window-size={window_size[0]},{window_size[1]}")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option('useAutomationExtension', False)
+    if headless or HEADLESS:
+        options.add_argument("--headless=new")
+    return options
+
+
+def launch_chrome(options, driver_cls=None, **driver_kwargs):
+    from selenium.webdriver.chrome.service import Service
+    from selenium.common.exceptions import SessionNotCreatedException
+    if driver_cls is None:
+        from selenium.webdriver import Chrome as driver_cls
+    with instrument.timer("browser_start"):
+        try:
+            driver = driver_cls(service=Service(chromedriver_path()), options=options, **driver_kwargs)
+        except SessionNotCreatedException as e:
+            # Usually Chrome auto-updated past the cached chromedriver: resolve a matching one and retry once
+            logging.warning(f"🔁 Chrome session not created, re-resolving chromedriver: {e}")
+            instrument.incr("driver_refreshes")
+            driver = driver_cls(service=Service(chromedriver_path(refresh=True)), options=options, **driver_kwargs)
+    driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": STEALTH_JS})
+    driver.set_page_load_timeout(25)
+    return driver
+
+
+# === Cookies ===
+def load_cookie_file():
+    if not os.path.exists(COOKIES_FILE):
+        return []
+    with open(COOKIES_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_cookie_file(cookies):
+    # Sessions recycle concurrently and several crawlers share the jar, so each write gets its own temp file
+    os.makedirs(SESSION_DIR, exist_ok=True)
+    with _cookie_lock:
+        fd, tmp_path = tempfile.mkstemp(dir=SESSION_DIR, prefix="cookies.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(cookies, f, ensure_ascii=False)
+            os.replace(tmp_path, COOKIES_FILE)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+def restore_cookies(driver):
+    cookies = load_cookie_file()
+    if not cookies:
+        return False
+    driver.get(LOGIN_URL)  # cookies can only be set for the current domain
+    for cookie in cookies:
+        cookie = {k: v for k, v in cookie.items() if k != "sameSite" or v in ("Strict", "Lax", "None")}
+        try:
+            driver.add_cookie(cookie)
+        except Exception as e:
+            logging.debug(f"Cookie {cookie.get('name')} rejected: {e}")
+    return True
+
+
+def ensure_login(driver, prompt="🔐 请手动完成登录（验证码或账户）。完成后按 [ENTER] 继续..."):
+    """Reuse saved cookies when they still work, otherwise fall back to one manual login."""
+    with instrument.timer("login"):
+        restored = restore_cookies(driver)
+        driver.get(LOGIN_URL)
+        if restored and not is_blocked(driver):
+            instrument.incr("login_reused")
+            return
+        # An unblocked page is not a login: without a saved jar the first run always logs in by hand
+        if restored:
+            logging.warning("🔐 Saved session is no longer valid, manual login required")
+        else:
+            logging.info("🔐 No saved session yet, manual login required")
+        with instrument.timer("manual_login"):
+            input(prompt)
+        save_cookie_file(driver.get_cookies())
+        instrument.incr("login_manual")
+
+
+# === Pool ===
+class BrowserSession:
+    def __init__(self, slot, factory):
+        self.slot = slot
+        self.factory = factory
+        self.driver = None
+        self.pages = 0
+
+    def start(self):
+        self.driver = self.factory(f"chrome-{self.slot}")
+        self.pages = 0
+        return self
+
+    def recycle(self):
+        logging.info(f"♻️ Recycling browser {self.slot} after {self.pages} pages")
+        instrument.incr("browser_recycles")
+        self.close(save=True)
+        self.start()
+        restore_cookies(self.driver)
+
+    def close(self, save=False):
+        if self.driver is None:
+            return
+        try:
+            if save:
+                save_cookie_file(self.driver.get_cookies())
+            self.driver.quit()
+        finally:
+            self.driver = None
+
+
+class SessionPool:
+    """Warm, pre-authenticated Chrome sessions shared by crawl workers.
+
+    Each slot keeps its own persistent profile directory (Chrome locks a
+    profile per process) and all slots share one saved cookie jar, so only
+    the very first run needs a manual login. A browser is restarted after
+    `recycle_after` pages to keep its memory in check.
+    """
+
+    def __init__(self, size=1, factory=None, recycle_after=RECYCLE_AFTER):
+        self.size = size
+        self.factory = factory or (lambda profile: launch_chrome(chrome_options(profile)))
+        self.recycle_after = recycle_after
+        self.sessions = [BrowserSession(slot, self.factory) for slot in range(size)]
+        self.idle = queue.Queue()
+
+    def start(self):
+        # First browser may need a manual login; the rest reuse its cookies in parallel
+        first = self.sessions[0].start()
+        ensure_login(first.driver)
+        self.idle.put(first)
+
+        def warm(session):
+            session.start()
+            restore_cookies(session.driver)
+            return session
+
+        with ThreadPoolExecutor(max_workers=max(1, self.size - 1)) as pool:
+            for session in pool.map(warm, self.sessions[1:]):
+                self.idle.put(session)
+        return self
+
+    @contextmanager
+    def session(self):
+        """Borrow a browser for one page of work."""
+        session = self.idle.get()
+        try:
+            if session.driver is None:
+                # An earlier recycle failed part-way; relaunch before handing the slot out
+                session.start()
+                restore_cookies(session.driver)
+            yield session
+        finally:
+            session.pages += 1
+            try:
+                if session.pages >= self.recycle_after:
+                    session.recycle()
+            finally:
+                # Always hand the slot back, or every other worker waits on it forever
+                self.idle.put(session)
+
+    def close(self):
+        for i, session in enumerate(self.sessions):
+            session.close(save=(i == 0))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# === Playwright ===
+def to_playwright_cookies(cookies):
+    converted = []
+    for c in cookies:
+        cookie = {k: c[k] for k in ("name", "value", "domain", "path", "secure", "httpOnly") if k in c}
+        if "expiry" in c:
+            cookie["expires"] = c["expiry"]
+        if c.get("sameSite") in ("Strict", "Lax", "None"):
+            cookie["sameSite"] = c["sameSite"]
+        converted.append(cookie)
+    return converted
+
+
+def from_playwright_cookies(cookies):
+    converted = []
+    for c in cookies:
+        cookie = {k: c[k] for k in ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite") if k in c}
+        if c.get("expires", -1) > 0:
+            cookie["expiry"] = int(c["expires"])
+        converted.append(cookie)
+    return converted
+
+
+def playwright_context(p, headless=False, user_agent=None):
+    """Persistent Chromium context seeded with the shared cookie jar."""
+    with instrument.timer("browser_start"):
+        context = p.chromium.launch_persistent_context(
+            os.path.abspath(os.path.join(PROFILE_DIR, "playwright")),
+            headless=headless or HEADLESS, user_agent=user_agent,
+        )
+    cookies = load_cookie_file()
+    if cookies:
+        context.add_cookies(to_playwright_cookies(cookies))
+    return context
+
+
+def save_playwright_cookies(context):
+    save_cookie_file(from_playwright_cookies(context.cookies()))
@@ -1,28 +1,30 @@
 import os
 import csv
 import re
-import time
 import random
 import logging
-from selenium import webdriver
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
-from webdriver_manager.chrome import ChromeDriverManager
-
-# === Setup ===
-os.makedirs("results", exist_ok=True)
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.FileHandler("results/crawler_final.log", mode="w", encoding="utf-8"),
-        logging.StreamHandler()
-    ]
-)
+import instrument
+import session_pool
+import crawl_fixtures
+import discovery
+
+# === Config ===
+RESULTS_DIR = "results"
+LOG_FILE = "results/crawler_final.log"
+CSV_PATH = "results/products_final.csv"
+CSV_FIELDS = ["product_id", "cover_url", "avail_ids", "avail_urls"]
+COLLECTIONS = [c.strip() for c in os.environ.get("CRAWL_COLLECTIONS", "/collections/").split(",") if c.strip()]
+MAX_PAGES = int(os.environ.get("CRAWL_MAX_PAGES", "500"))  # per collection, safety cap
+STALE_PAGES = int(os.environ.get("CRAWL_STALE_PAGES", "3"))  # stop a collection after N pages with nothing new (0: never)
+REFRESH = os.environ.get("CRAWL_REFRESH", "0") == "1"  # 1: rewrite the CSV, re-crawling saved products after new ones
+CARD_SELECTOR = "div.prdcard-wrapper a"
+BROWSERS = int(os.environ.get("CRAWL_BROWSERS", "1"))
 
 USER_AGENTS = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64)...",
@@ -30,85 +32,92 @@ USER_AGENTS = [
     # Add more realistic user agents
 ]
 
-# === Chrome Options ===
-options = Options()
-options.add_argument(f"--user-agent={random.choice(USER_AGENTS)}")
-w, h = random.randint(1200, 1400), random.randint(700, 900)
-options.add_argument(f"--window-size={w},{h}")
-options.add_argument("--disable-blink-features=AutomationControlled")
-options.add_experimental_option("excludeSwitches", ["enable-automation"])
-options.add_experimental_option('useAutomationExtension', False)
-options.add_argument("--headless=new")
-
-driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {
-    "source": """
-        Object.defineProperty(navigator, 'webdriver', {get: () => undefined})
-    """
-})
-driver.set_page_load_timeout(25)
-
-# === Manual Login Step ===
-login_url = "https://modesens.cn/collections/"
-driver.get(login_url)
-input("🔐 请手动完成登录（验证码或账户）。完成后按 [ENTER] 继续...")
-
-# === CSV Output ===
-csv_path = "results/products_final.csv"
-csv_fields = ["product_id", "cover_url", "avail_ids", "avail_urls"]
-csv_file = open(csv_path, "w", newline='', encoding="utf-8")
-csv_writer = csv.DictWriter(csv_file, fieldnames=csv_fields)
-csv_writer.writeheader()
+
+def setup_logging():
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        handlers=[
+            logging.FileHandler(LOG_FILE, mode="w", encoding="utf-8"),
+            logging.StreamHandler()
+        ]
+    )
+
+
+def create_driver(profile):
+    w, h = random.randint(1200, 1400), random.randint(700, 900)
+    options = session_pool.chrome_options(
+        profile, user_agent=random.choice(USER_AGENTS), headless=True, window_size=(w, h)
+    )
+    return session_pool.launch_chrome(options)
+
 
 def extract_product_id(url):
     match = re.search(r'-([0-9]+)/?$', url)
     return match.group(1) if match else ""
 
+
+@instrument.timed("scroll")
 def human_scroll(driver):
     scroll_pause = random.uniform(0.5, 1.5)
     height = driver.execute_script("return document.body.scrollHeight")
     for y in range(0, height, 400):
         driver.execute_script(f"window.scrollTo(0, {y});")
-        time.sleep(scroll_pause)
+        session_pool.pause(scroll_pause)
+
 
-def safe_get(url, retries=3, wait_on_block=True):
+def safe_get(driver, url, retries=session_pool.BLOCK_RETRIES, wait_on_block=session_pool.WAIT_ON_BLOCK):
     for attempt in range(retries):
+        if attempt:
+            instrument.incr("safe_get_retries")
         try:
-            driver.get(url)
-            if "403" in driver.title or "登录" in driver.title or "captcha" in driver.page_source.lower():
-                logging.warning(f"🔐 CAPTCHA or block detected: {url}")
-                if wait_on_block:
-                    input("🛑 请手动解决问题后按 [ENTER] 继续...")
-                else:
-                    time.sleep(2 ** attempt + random.uniform(0.5, 1.5))
+            with instrument.timer("page_load", url=url, attempt=attempt):
+                driver.get(url)
+            if session_pool.is_blocked(driver):
+                session_pool.wait_out_block(url, attempt, wait_on_block)
                 continue
             return True
         except Exception as e:
             logging.warning(f"⚠️ Error on attempt {attempt+1}/{retries}: {e}")
-            time.sleep(2 ** attempt)
+            instrument.incr("page_load_errors")
+            with instrument.timer("retry_backoff"):
+                session_pool.pause(2 ** attempt)
+    instrument.incr("page_load_failures")
     return False
 
-# === Crawl ===
-try:
-    for page in range(1, 4):
-        url = f"https://modesens.cn/collections/?page={page}"
-        logging.info(f"🔗 Visiting: {url}")
-        if not safe_get(url):
-            continue
 
-        human_scroll(driver)
-        time.sleep(random.uniform(2, 3.5))
+def scrape_listing(driver, url):
+    """Product (href, cover) pairs on a listing page: [] once the listing is exhausted, None if it failed to load."""
+    logging.info(f"🔗 Visiting: {url}")
+    if not safe_get(driver, url):
+        return None
 
-        try:
-            WebDriverWait(driver, 10).until(
-                EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div.prdcard-wrapper a"))
-            )
-        except Exception as e:
-            logging.warning(f"⚠️ Product links not found on page {page}: {e}")
-            continue
+    human_scroll(driver)
+    session_pool.pause(2, 3.5)
 
-        product_links = []
-        for link in driver.find_elements(By.CSS_SELECTOR, "div.prdcard-wrapper a"):
+    # Wait for product cards, or for a fully loaded page that has none
+    try:
+        WebDriverWait(driver, 10).until(
+            lambda d: d.find_elements(By.CSS_SELECTOR, CARD_SELECTOR)
+            or d.execute_script("return document.readyState") == "complete"
+        )
+        if not driver.find_elements(By.CSS_SELECTOR, CARD_SELECTOR):
+            # Cards may still be rendering after the document itself has loaded
+            WebDriverWait(driver, 5).until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, CARD_SELECTOR)))
+    except TimeoutException:
+        if driver.execute_script("return document.readyState") != "complete" or session_pool.is_blocked(driver):
+            logging.warning(f"⚠️ Listing did not finish loading: {url}")
+            instrument.incr("listing_timeouts")
+            return None
+        crawl_fixtures.record_driver(driver)
+        logging.info(f"📭 No products on {url}")
+        return []
+    crawl_fixtures.record_driver(driver)
+
+    product_links = []
+    with instrument.timer("extract_listing", url=url):
+        for link in driver.find_elements(By.CSS_SELECTOR, CARD_SELECTOR):
             href = link.get_attribute("href")
             if not href or "/product/" not in href:
                 continue
@@ -118,45 +127,158 @@ try:
             except:
                 img_src = ""
             product_links.append((href, img_src))
+    instrument.incr("listing_pages")
 
-        logging.info(f"📦 Page {page} contains {len(product_links)} products.")
+    logging.info(f"📦 {url} contains {len(product_links)} products.")
+    return product_links
 
-        for product_url, cover_url in product_links:
-            product_id = extract_product_id(product_url)
-            if not product_id:
-                continue
 
-            if not safe_get(product_url):
-                continue
+def scrape_product(driver, product_id, product_url, cover_url):
+    if not safe_get(driver, product_url):
+        return None
+
+    session_pool.pause(2.0, 3.0)
+    human_scroll(driver)
+    session_pool.pause(1.5)
+
+    try:
+        WebDriverWait(driver, 5).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, "div.avail[id^='a']"))
+        )
+    except TimeoutException:
+        logging.warning(f"⚠️ No availabilities found for {product_id}")
+    crawl_fixtures.record_driver(driver)
+
+    avail_ids, avail_urls = [], []
+    with instrument.timer("extract_product", product_id=product_id):
+        for avail in driver.find_elements(By.CSS_SELECTOR, "div.avail[id^='a']"):
+            aid = avail.get_attribute("id")
+            if aid:
+                avail_ids.append(aid)
+                avail_urls.append(f"https://modesens.cn/product/avail/{aid[1:]}/getlink/")
+
+    session_pool.pause(1.5, 2.5)
+    return {
+        "product_id": product_id,
+        "cover_url": cover_url,
+        "avail_ids": ";".join(avail_ids),
+        "avail_urls": ";".join(avail_urls)
+    }
+
+
+def discover(pool, frontier, collection):
+    """Walk a collection's listing pages until they run out, feeding new products to the frontier."""
+    stale = 0
+    for page in range(1, MAX_PAGES + 1):
+        url = discovery.listing_url(session_pool.BASE_URL, collection, page)
+        with pool.session() as session:
+            product_links = scrape_listing(session.driver, url)
+        if product_links == []:
+            logging.info(f"🏁 {collection} exhausted after {page - 1} pages.")
+            return
 
-            time.sleep(random.uniform(2.0, 3.0))
-            human_scroll(driver)
-            time.sleep(1.5)
+        # A page that failed to load counts as stale, so a dead collection still stops
+        fresh = 0
+        for href, img_src in product_links or []:
+            product_id = extract_product_id(href)
+            if product_id and frontier.push(product_id, (href, img_src)):
+                fresh += 1
+        stale = 0 if fresh else stale + 1
+        if STALE_PAGES and stale >= STALE_PAGES:
+            logging.info(f"🏁 {collection}: nothing new on the last {stale} pages, stopping.")
+            return
 
+
+def crawl(pool, csv_writer, known=None):
+    """Crawl every collection into `csv_writer`; returns the ids of the products written."""
+    frontier = discovery.Frontier(known, refresh=REFRESH)
+    saved = discovery.SeenSet()
+    write_lock = threading.Lock()
+
+    def work():
+        while (entry := frontier.pop()) is not None:
+            product_id, (product_url, cover_url) = entry
             try:
-                WebDriverWait(driver, 5).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, "div.avail[id^='a']"))
-                )
-            except TimeoutException:
-                logging.warning(f"⚠️ No availabilities found for {product_id}")
-
-            avail_ids, avail_urls = [], []
-            for avail in driver.find_elements(By.CSS_SELECTOR, "div.avail[id^='a']"):
-                aid = avail.get_attribute("id")
-                if aid:
-                    avail_ids.append(aid)
-                    avail_urls.append(f"https://modesens.cn/product/avail/{aid[1:]}/getlink/")
-
-            csv_writer.writerow({
-                "product_id": product_id,
-                "cover_url": cover_url,
-                "avail_ids": ";".join(avail_ids),
-                "avail_urls": ";".join(avail_urls)
-            })
-            logging.info(f"✅ Saved product {product_id} with {len(avail_ids)} availabilities.")
-            time.sleep(random.uniform(1.5, 2.5))
-
-finally:
-    driver.quit()
-    csv_file.close()
+                with pool.session() as session:
+                    row = scrape_product(session.driver, product_id, product_url, cover_url)
+            except Exception as e:
+                # Keep this worker alive: it may be the only one draining the frontier
+                logging.warning(f"⚠️ Failed to scrape product {product_id}: {e}")
+                instrument.incr("product_errors")
+                continue
+            if row is None:
+                continue
+            with write_lock:
+                csv_writer.writerow(row)
+            saved.add(product_id)
+            instrument.incr("products_saved")
+            n_avail = len(row["avail_ids"].split(";")) if row["avail_ids"] else 0
+            logging.info(f"✅ Saved product {product_id} with {n_avail} availabilities.")
+
+    # Collections are discovered in parallel while product workers drain the frontier
+    with ThreadPoolExecutor(max_workers=len(COLLECTIONS) + pool.size) as executor:
+        discoverers = [executor.submit(discover, pool, frontier, c) for c in COLLECTIONS]
+        workers = [executor.submit(work) for _ in range(pool.size)]
+        try:
+            for future in discoverers:
+                future.result()
+        finally:
+            frontier.close()
+        for future in workers:
+            future.result()
+    return saved
+
+
+def load_known_products(csv_path):
+    if not os.path.exists(csv_path):
+        return discovery.SeenSet()
+    with open(csv_path, newline='', encoding="utf-8") as f:
+        return discovery.SeenSet(row["product_id"] for row in csv.DictReader(f) if row["product_id"])
+
+
+def carry_over(csv_path, csv_writer, saved):
+    """Copy rows from the previous CSV whose products were not written again this run."""
+    if not os.path.exists(csv_path):
+        return 0
+    kept = 0
+    with open(csv_path, newline='', encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            if row["product_id"] and row["product_id"] not in saved:
+                csv_writer.writerow({k: row.get(k, "") for k in CSV_FIELDS})
+                kept += 1
+    return kept
+
+
+def main():
+    setup_logging()
+    instrument.setup("task1new")
+
+    # === Warm browsers, login only if the saved session has expired ===
+    pool = session_pool.SessionPool(size=BROWSERS, factory=create_driver).start()
+
+    # === CSV Output: append new products, or rebuild a temp copy when refreshing ===
+    known = load_known_products(CSV_PATH)
+    logging.info(f"📚 {len(known)} products already saved, crawling new ones first.")
+    append = len(known) > 0 and not REFRESH
+    out_path = CSV_PATH if append else CSV_PATH + ".tmp"
+    csv_file = open(out_path, "a" if append else "w", newline='', encoding="utf-8")
+    csv_writer = csv.DictWriter(csv_file, fieldnames=CSV_FIELDS)
+    if not append:
+        csv_writer.writeheader()
+
+    try:
+        saved = crawl(pool, csv_writer, known)
+        if not append:
+            kept = carry_over(CSV_PATH, csv_writer, saved)
+            if kept:
+                logging.info(f"📎 Kept {kept} saved products that were not re-crawled.")
+            csv_file.close()
+            os.replace(out_path, CSV_PATH)  # only a finished refresh replaces the saved CSV
+    finally:
+        pool.close()
+        csv_file.close()
     logging.info("🎉 Done. All results saved to products_final.csv")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,54 @@
 import os
 import csv
+import logging
 import requests
 from tqdm import tqdm
+import instrument
 
-os.makedirs("images", exist_ok=True)
+# Config
+CSV_FILE = "results/products_final.csv"
+IMAGE_FOLDER = "images"
 
-csv_file = "results/products_final.csv"
 
+def download_covers(csv_file=CSV_FILE, image_folder=IMAGE_FOLDER):
+    os.makedirs(image_folder, exist_ok=True)
 
-with open(csv_file, newline='', encoding='utf-8') as f:
-    reader = csv.DictReader(f)
-    rows = list(reader)
+    with open(csv_file, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        rows = list(reader)
 
-for row in tqdm(rows, desc="Downloading images"):
-    product_id = row["product_id"]
-    cover_url = row["cover_url"]
+    for row in tqdm(rows, desc="Downloading images"):
+        product_id = row["product_id"]
+        cover_url = row["cover_url"]
 
-    if not product_id or not cover_url:
-        continue
+        if not product_id or not cover_url:
+            continue
 
-    output_path = f"images/{product_id}.jpg"
+        output_path = os.path.join(image_folder, f"{product_id}.jpg")
 
-    if os.path.exists(output_path):
-        continue  # skip if already downloaded
+        if os.path.exists(output_path):
+            instrument.incr("download_cached")
+            continue  # skip if already downloaded
 
-    try:
-        response = requests.get(cover_url, timeout=10)
-        if response.status_code == 200:
-            with open(output_path, "wb") as out:
-                out.write(response.content)
-    except Exception as e:
-        print(f"Failed to download image for {product_id}: {e}")
+        try:
+            with instrument.timer("download", product_id=product_id):
+                response = requests.get(cover_url, timeout=10)
+            if response.status_code == 200:
+                with open(output_path, "wb") as out:
+                    out.write(response.content)
+                instrument.incr("download_bytes", len(response.content))
+            else:
+                instrument.incr("download_errors")
+        except Exception as e:
+            instrument.incr("download_errors")
+            print(f"Failed to download image for {product_id}: {e}")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    instrument.setup("task2Image")
+    download_covers()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,74 @@
 import os
 import csv
-import imagehash
-from PIL import Image
+import logging
 from collections import defaultdict
 from tqdm import tqdm
+import instrument
+from image_analysis import lazy
 
 # Config
 CSV_FILE = "results/products_final.csv"
 IMAGE_FOLDER = "images"
+OUTPUT_FILE = "results/similarity_results.csv"
 TOP_K = 5  # Number of most similar products to find
 
-# Step 1: Compute hashes for all images
-hashes = {}
-product_ids = []
-
-with open(CSV_FILE, newline='', encoding='utf-8') as f:
-    reader = csv.DictReader(f)
-    for row in reader:
-        product_id = row["product_id"]
-        path = os.path.join(IMAGE_FOLDER, f"{product_id}.jpg")
-        if os.path.exists(path):
-            try:
-                img = Image.open(path).convert("RGB")
-                hashes[product_id] = imagehash.phash(img)
-                product_ids.append(product_id)
-            except Exception as e:
-                print(f"⚠️ Couldn't hash image for {product_id}: {e}")
-
-# Step 2: Compare hashes and keep top-K
-similarities = defaultdict(list)
-for pid1 in tqdm(product_ids, desc="Comparing products"):
-    for pid2 in product_ids:
-        if pid1 == pid2:
-            continue
-        distance = hashes[pid1] - hashes[pid2]
-        similarities[pid1].append((pid2, distance))
-
-    similarities[pid1] = sorted(similarities[pid1], key=lambda x: x[1])[:TOP_K]
-
-# Step 3: Save to CSV
-output_file = "results/similarity_results.csv"
-with open(output_file, "w", newline='', encoding='utf-8') as f:
-    writer = csv.writer(f)
-    writer.writerow(["product_id", "similar_product_ids"])
-    for pid, simlist in similarities.items():
-        ids = [s[0] for s in simlist]
-        writer.writerow([pid, ";".join(ids)])
-
-print(f"✅ Similarity results saved to: {output_file}")
+
+def compute_hashes(csv_file=CSV_FILE, image_folder=IMAGE_FOLDER):
+    hashes = {}
+    product_ids = []
+
+    with open(csv_file, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            product_id = row["product_id"]
+            path = os.path.join(image_folder, f"{product_id}.jpg")
+            if os.path.exists(path):
+                try:
+                    with instrument.timer("decode"):
+                        img = lazy("PIL.Image").open(path).convert("RGB")
+                    with instrument.timer("hash"):
+                        hashes[product_id] = lazy("imagehash").phash(img)
+                    product_ids.append(product_id)
+                except Exception as e:
+                    print(f"⚠️ Couldn't hash image for {product_id}: {e}")
+
+    return hashes, product_ids
+
+
+def top_k_similar(hashes, product_ids, top_k=TOP_K):
+    similarities = defaultdict(list)
+    for pid1 in tqdm(product_ids, desc="Comparing products"):
+        with instrument.timer("compare"):
+            for pid2 in product_ids:
+                if pid1 == pid2:
+                    continue
+                distance = hashes[pid1] - hashes[pid2]
+                similarities[pid1].append((pid2, distance))
+
+            similarities[pid1] = sorted(similarities[pid1], key=lambda x: x[1])[:top_k]
+    return similarities
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    instrument.setup("task2_similarity")
+
+    # Step 1: Compute hashes for all images
+    hashes, product_ids = compute_hashes()
+
+    # Step 2: Compare hashes and keep top-K
+    similarities = top_k_similar(hashes, product_ids)
+
+    # Step 3: Save to CSV
+    with open(OUTPUT_FILE, "w", newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["product_id", "similar_product_ids"])
+        for pid, simlist in similarities.items():
+            ids = [s[0] for s in simlist]
+            writer.writerow([pid, ";".join(ids)])
+
+    print(f"✅ Similarity results saved to: {OUTPUT_FILE}")
+
+
+if __name__ == "__main__":
+    main()
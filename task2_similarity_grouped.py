@@ -1,74 +1,90 @@
 import os
 import csv
-import imagehash
-from PIL import Image
-from collections import defaultdict
-from tqdm import tqdm
-from skimage.metrics import structural_similarity as ssim
+import logging
 import numpy as np
+from tqdm import tqdm
+from thumb_store import build_store
+from image_analysis import ssim
+import instrument
 
 # Config
 CSV_FILE = "results/products_final.csv"
 IMAGE_FOLDER = "images"
+STORE_DIR = "results/thumbs"
 OUTPUT_FILE = "results/similarity_results.csv"
 TOP_PHASH_CANDIDATES = 15
 TOP_FINAL = 5
 EXCLUDE_IDS = {"10924475"}  # Exclude known bad items
+MEMORY_BUDGET_MB = int(os.environ.get("SIM_MEMORY_MB", "512"))  # Cap for thumbnails held in RAM at once
+SSIM_WORK_BYTES = 8 * 12  # Rough float64 scratch per pixel used inside one SSIM call
+
+def plan_ssim_tier(store, budget_bytes):
+    """Pick the largest thumbnail tier that fits the budget and a query block size for it."""
+    for size in sorted(store.sizes, reverse=True):
+        row_bytes = size * size
+        fixed = row_bytes * TOP_PHASH_CANDIDATES + row_bytes * SSIM_WORK_BYTES
+        if budget_bytes >= fixed + row_bytes:
+            return size, max(1, (budget_bytes - fixed) // row_bytes)
+        logging.warning(f"⚠️ {size}x{size} SSIM tier does not fit in {budget_bytes // 2**20} MB, trying a smaller one")
+    return None, 0
+
+
+def rank_candidates(store, budget_bytes):
+    n = len(store)
+    size, block = plan_ssim_tier(store, budget_bytes)
+    if size is None:
+        logging.warning("⚠️ No SSIM tier fits the memory budget, falling back to phash ranking only")
+    else:
+        logging.info(f"📐 SSIM on {size}x{size} thumbnails, streaming {block} products per block")
+    thumbs = store.tiers.get(size)
+
+    combined_results = {}
+    with tqdm(total=n, desc="Comparing phash + SSIM") as bar:
+        for start in range(0, n, block or n or 1):
+            stop = min(start + (block or n), n)
+            # Contiguous read of the query block, candidates are fetched per query
+            queries = np.array(thumbs[start:stop]) if thumbs is not None else None
+
+            for row in range(start, stop):
+                with instrument.timer("compare_phash"):
+                    dists = store.phash_distances(row)
+                    top_candidates = np.argsort(dists, kind="stable")[:min(TOP_PHASH_CANDIDATES, n - 1)]
+                # Skip other rows for the same product, e.g. in a store built before ids were de-duplicated
+                ranked = [int(i) for i in top_candidates if store.ids[i] != store.ids[row]]
 
-# Load phash and image
-hashes = {}
-images = {}
-product_ids = []
+                if queries is not None and ranked:
+                    try:
+                        order = np.sort(top_candidates)  # read the memmap front to back
+                        cand_imgs = dict(zip(order.tolist(), thumbs[order]))
+                        img1 = queries[row - start]
+                        with instrument.timer("compare_ssim"):
+                            ssim_scores = [(i, ssim(img1, cand_imgs[i])) for i in ranked]
+                        ranked = [i for i, _ in sorted(ssim_scores, key=lambda x: -x[1])]
+                    except MemoryError:
+                        logging.warning(f"⚠️ Out of memory on SSIM for {store.ids[row]}, keeping phash order")
+                        instrument.incr("ssim_oom_fallbacks")
 
-def load_image_gray(path):
-    img = Image.open(path).convert("L").resize((200, 200))
-    return np.array(img)
+                combined_results[store.ids[row]] = [store.ids[i] for i in ranked[:TOP_FINAL]]
+                bar.update(1)
 
-with open(CSV_FILE, newline='', encoding="utf-8") as f:
-    reader = csv.DictReader(f)
-    for row in reader:
-        pid = row["product_id"]
-        if pid in EXCLUDE_IDS:
-            continue
-        path = os.path.join(IMAGE_FOLDER, f"{pid}.jpg")
-        if os.path.exists(path):
-            try:
-                pil_img = Image.open(path).convert("RGB")
-                hashes[pid] = imagehash.phash(pil_img)
-                images[pid] = load_image_gray(path)
-                product_ids.append(pid)
-            except Exception as e:
-                print(f"⚠️ Skipped {pid}: {e}")
+    return combined_results
 
-# Step 1: Get phash candidates
-combined_results = {}
 
-for pid1 in tqdm(product_ids, desc="Comparing phash"):
-    candidates = []
-    for pid2 in product_ids:
-        if pid1 == pid2:
-            continue
-        phash_dist = hashes[pid1] - hashes[pid2]
-        candidates.append((pid2, phash_dist))
-    
-    top_candidates = sorted(candidates, key=lambda x: x[1])[:TOP_PHASH_CANDIDATES]
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    instrument.setup("task2_similarity_grouped")
+    store = build_store(CSV_FILE, IMAGE_FOLDER, STORE_DIR, exclude_ids=EXCLUDE_IDS)
+    combined_results = rank_candidates(store, MEMORY_BUDGET_MB * 2**20)
 
-    # Step 2: Compute SSIM on top candidates
-    ssim_scores = []
-    img1 = images[pid1]
-    for pid2, _ in top_candidates:
-        img2 = images[pid2]
-        score, _ = ssim(img1, img2, full=True)
-        ssim_scores.append((pid2, score))
+    # Save CSV
+    with open(OUTPUT_FILE, "w", newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["product_id", "similar_product_ids"])
+        for pid, simlist in combined_results.items():
+            writer.writerow([pid, ";".join(simlist)])
 
-    final_top = sorted(ssim_scores, key=lambda x: -x[1])[:TOP_FINAL]
-    combined_results[pid1] = [p[0] for p in final_top]
+    print(f"✅ Combined similarity saved to: {OUTPUT_FILE}")
 
-# Step 3: Save CSV
-with open(OUTPUT_FILE, "w", newline='', encoding='utf-8') as f:
-    writer = csv.writer(f)
-    writer.writerow(["product_id", "similar_product_ids"])
-    for pid, simlist in combined_results.items():
-        writer.writerow([pid, ";".join(simlist)])
 
-print(f"✅ Combined similarity saved to: {OUTPUT_FILE}")
+if __name__ == "__main__":
+    main()
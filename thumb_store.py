@@ -0,0 +1,112 @@
+import os
+import csv
+import json
+import numpy as np
+from tqdm import tqdm
+from image_analysis import open_gray, phash_bits
+
+# Config
+THUMB_SIZE = 200
+LOWRES_SIZE = 64  # Optional low-resolution SSIM tier, set to None to skip it
+META_FILE = "meta.json"
+IDS_FILE = "ids.txt"
+HASH_FILE = "phash.u8"
+HASH_BYTES = 8  # 64-bit phash packed into bytes
+
+# Bit count for every byte value, used for vectorised hamming distance
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def tier_path(store_dir, size):
+    return os.path.join(store_dir, f"thumbs_{size}.u8")
+
+
+def list_product_images(csv_file, image_folder, exclude_ids=()):
+    pids, seen = [], set()
+    with open(csv_file, newline='', encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            pid = row["product_id"]
+            if pid in exclude_ids or pid in seen:
+                continue  # the CSV can list a product more than once; keep its first row
+            seen.add(pid)
+            if os.path.exists(os.path.join(image_folder, f"{pid}.jpg")):
+                pids.append(pid)
+    return pids
+
+
+def build_store(csv_file, image_folder, store_dir, exclude_ids=(), lowres_size=LOWRES_SIZE):
+    """Pack every product thumbnail into contiguous uint8 memmaps on disk.
+
+    Images are decoded one at a time and written straight into the memmap,
+    so resident memory stays flat no matter how many products there are.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    pids = list_product_images(csv_file, image_folder, exclude_ids)
+    capacity = max(len(pids), 1)
+
+    sizes = [THUMB_SIZE] + ([lowres_size] if lowres_size else [])
+    tiers = {
+        size: np.memmap(tier_path(store_dir, size), dtype=np.uint8, mode="w+", shape=(capacity, size, size))
+        for size in sizes
+    }
+    hashes = np.memmap(os.path.join(store_dir, HASH_FILE), dtype=np.uint8, mode="w+", shape=(capacity, HASH_BYTES))
+
+    kept = []
+    for pid in tqdm(pids, desc="Packing thumbnails"):
+        path = os.path.join(image_folder, f"{pid}.jpg")
+        try:
+            gray = open_gray(path)
+            row = len(kept)
+            hashes[row] = np.packbits(phash_bits(gray))
+            for size, arr in tiers.items():
+                arr[row] = np.asarray(gray.resize((size, size)))
+            kept.append(pid)
+        except Exception as e:
+            print(f"⚠️ Skipped {pid}: {e}")
+
+    for arr in tiers.values():
+        arr.flush()
+    hashes.flush()
+    del tiers, hashes
+
+    with open(os.path.join(store_dir, IDS_FILE), "w", encoding="utf-8") as f:
+        f.write("\n".join(kept))
+    with open(os.path.join(store_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump({"count": len(kept), "capacity": capacity, "sizes": sizes}, f)
+
+    return open_store(store_dir)
+
+
+class ThumbStore:
+    """Read-only view over a packed thumbnail store."""
+
+    def __init__(self, store_dir):
+        with open(os.path.join(store_dir, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(store_dir, IDS_FILE), encoding="utf-8") as f:
+            self.ids = [line for line in f.read().split("\n") if line]
+
+        self.count = meta["count"]
+        self.sizes = meta["sizes"]
+        capacity = meta["capacity"]
+        # Hashes are tiny (8 bytes per product), keep them resident
+        self.hashes = np.array(np.memmap(
+            os.path.join(store_dir, HASH_FILE), dtype=np.uint8, mode="r", shape=(capacity, HASH_BYTES)
+        )[:self.count])
+        self.tiers = {
+            size: np.memmap(tier_path(store_dir, size), dtype=np.uint8, mode="r", shape=(capacity, size, size))
+            for size in self.sizes
+        }
+
+    def __len__(self):
+        return self.count
+
+    def phash_distances(self, row):
+        dists = POPCOUNT[np.bitwise_xor(self.hashes, self.hashes[row])].sum(axis=1, dtype=np.int32)
+        dists[row] = np.iinfo(np.int32).max  # never match a product with itself
+        return dists
+
+
+def open_store(store_dir):
+    return ThumbStore(store_dir)